@@ -0,0 +1,855 @@
+'''
+pyutillib/benchmarks
+
+usage:
+    python -m pyutillib.benchmarks [name ...]
+
+Runs all benchmarks, or only the ones named on the command line, and prints
+the time per call of the reference implementation and of the optimised one.
+
+Copyright (C) 2013 Edwin van Opstal
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see `<http://www.gnu.org/licenses/>`.
+'''
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import bisect
+import datetime as dt
+import operator
+import os
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+import pyutillib.date_utils as du
+import pyutillib.math_utils as mu
+import pyutillib.parallel_utils as pu
+import pyutillib.string_utils as su
+
+
+def _time(func, number=1, repeat=5):
+    '''
+    Returns the best time in seconds of a single call to func.
+    '''
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def _report(label, t_ref, t_new):
+    '''
+    Prints a line with the reference time, the new time and the speedup.
+    '''
+    print('{:<40} {:>12.2f} us {:>12.2f} us {:>10.1f}x'.format(label,
+            t_ref * 1e6, t_new * 1e6, t_ref / t_new))
+
+
+def _weekdays(n_dates, start=dt.date(1990, 1, 1)):
+    '''
+    Returns a list of n_dates consecutive weekdays, like a trading calendar.
+    '''
+    dates = []
+    date = start
+    while len(dates) < n_dates:
+        if du.is_weekday(date):
+            dates.append(date)
+        date += du.DateList.ONE_DAY
+    return dates
+
+
+def _linear_index(datelist, date):
+    '''
+    The original DateList.index: linear scans, stepping back one calendar day
+    at a time.
+    '''
+    if date in datelist:
+        return list.index(datelist, date)
+    elif date < datelist[0]:
+        return 0
+    elif date > datelist[-1]:
+        return len(datelist) - 1
+    while date not in datelist:
+        date -= du.DateList.ONE_DAY
+    return list.index(datelist, date)
+
+
+def bench_datelist_index():
+    '''
+    DateList.index on trading calendars, queries include weekend dates.
+    '''
+    for n_dates in (10000, 100000, 1000000):
+        dates = du.DateList(_weekdays(n_dates))
+        span = (dates[-1] - dates[0]).days
+        queries = [dates[0] + dt.timedelta(days=random.randint(0, span))
+                for unused in range(20)]
+        t_ref = _time(lambda: [_linear_index(dates, d) for d in queries])
+        t_new = _time(lambda: [dates.index(d) for d in queries], number=100)
+        _report('DateList.index, {} dates'.format(n_dates),
+                t_ref / len(queries), t_new / len(queries))
+
+
+def _original_eval_conditions(conditions=None, data={}):
+    '''
+    The original eval_conditions: validates and interprets the conditions
+    for every data dict.
+    '''
+    if not conditions:
+        return True
+    if isinstance(conditions, (str, type(u''))):
+        conditions = su.str2tuple(conditions)
+    if not isinstance(conditions, tuple) or not len(conditions) == 3:
+        raise TypeError('conditions must be a tuple with 3 items.')
+    arg1 = conditions[0]
+    op = conditions[1]
+    arg2 = conditions[2]
+    if arg1 in data:
+        arg1 = data[arg1]
+    elif isinstance(arg1, tuple):
+        arg1 = _original_eval_conditions(arg1, data)
+    if arg2 in data:
+        arg2 = data[arg2]
+    elif isinstance(arg2, tuple):
+        arg2 = _original_eval_conditions(arg2, data)
+    if op in ('lt', 'le', 'eq', 'ne', 'ge', 'gt'):
+        if not (type(arg1) in (float, int) and type(arg2) in (float,int)) and \
+                type(arg1) != type(arg2):
+            raise TypeError('both arguments must have the same type {}, {}'.\
+                    format(arg1, arg2))
+    elif op in ('and', 'or'):
+        if not isinstance(arg1, bool) or not isinstance(arg2, bool):
+            raise TypeError('boolean operator {} needs boolean arguments {},'\
+                    ' {}'.format(op, arg1, arg2))
+        op += '_'
+    else:
+        raise ValueError('operator {} not supported', op)
+    return getattr(operator, op)(arg1, arg2)
+
+
+def bench_compile_conditions():
+    '''
+    Evaluating one rule for many data dicts with the original
+    eval_conditions, with the current (cached) eval_conditions and with one
+    compiled function.
+    '''
+    conditions = ((('a', 'gt', 10), 'and', ('b', 'le', 2.5)), 'or',
+            (('c', 'eq', 'abc'), 'and', ('d', 'ne', True)))
+    records = [{'a': random.randint(0, 20), 'b': random.random() * 5,
+            'c': random.choice(('abc', 'def')), 'd': random.random() < .5}
+            for unused in range(1000)]
+    t_ref = _time(lambda: [_original_eval_conditions(conditions, data)
+            for data in records])
+    t_cached = _time(lambda: [mu.eval_conditions(conditions, data)
+            for data in records])
+    evaluate = mu.compile_conditions(conditions)
+    t_new = _time(lambda: [evaluate(data) for data in records])
+    _report('eval_conditions, cached', t_ref / len(records),
+            t_cached / len(records))
+    _report('compile_conditions, precompiled', t_ref / len(records),
+            t_new / len(records))
+
+
+def bench_eval_conditions_many():
+    '''
+    Evaluating one rule for a table of records, row by row and in one call.
+    '''
+    conditions = ((('a', 'gt', 10), 'and', ('b', 'le', 2.5)), 'or',
+            ('c', 'eq', 'abc'))
+    n_records = 100000
+    columns = {'a': [random.randint(0, 20) for unused in range(n_records)],
+            'b': [random.random() * 5 for unused in range(n_records)],
+            'c': [random.choice(('abc', 'def')) for unused in range(n_records)]}
+    records = [dict(zip(columns, row)) for row in zip(*columns.values())]
+    t_ref = _time(lambda: [mu.eval_conditions(conditions, data)
+            for data in records])
+    t_new = _time(lambda: mu.eval_conditions_many(conditions, columns))
+    _report('eval_conditions_many, {} records'.format(n_records), t_ref, t_new)
+
+
+def bench_datestr2date_many():
+    '''
+    Parsing a column of date strings, with and without repeated dates.
+    '''
+    dates = _weekdays(5000)
+    for fmt in ('yyyymmdd', 'd-m-yyyy', 'mm/dd/yy'):
+        date_strs = [du.date2datestr(d, fmt) for d in dates]
+        for label, strs in (('unique', date_strs),
+                ('repeated', [random.choice(date_strs[:250])
+                    for unused in range(len(date_strs))])):
+            t_ref = _time(lambda: [du.datestr2date(s) for s in strs])
+            t_new = _time(lambda: list(du.datestr2date_many(strs)))
+            _report('datestr2date_many, {}, {}'.format(fmt, label),
+                    t_ref / len(strs), t_new / len(strs))
+
+
+def _original_date2datestr(date, fmt='yyyymmdd'):
+    '''
+    The original date2datestr: validates the format and calls strftime for
+    every date.
+    '''
+    if '-' in fmt:
+        if not fmt.index('d') < fmt.index('m') < fmt.index('y'):
+            raise ValueError('Invalid format string. {}'.format(
+                    du.VALID_DATE_FORMATS_TEXT))
+        d, m, y = fmt.split('-')
+    elif '/' in fmt:
+        if not fmt.index('m') < fmt.index('d') < fmt.index('y'):
+            raise ValueError('Invalid format string. {}'.format(
+                    du.VALID_DATE_FORMATS_TEXT))
+        m, d, y = fmt.split('/')
+    elif any(c not in 'dmy' for c in fmt):
+        raise ValueError('Invalid character in format string. {}'.format(
+                du.VALID_DATE_FORMATS_TEXT))
+    else:
+        if not fmt.index('y') < fmt.index('m') < fmt.index('d'):
+            raise ValueError('Invalid format string. {}'.format(
+                    du.VALID_DATE_FORMATS_TEXT))
+        y, m, d = fmt[:-4], fmt[-4:-2], fmt[-2:]
+    for string, char in ((d, 'd'), (m, 'm'), (y, 'y')):
+        if any(c != char for c in string):
+            raise ValueError('Invalid date format: {} is not {}'.\
+                    format(char, string))
+    if len(y) == 4:
+        fmt = fmt.replace('yyyy', '%Y', 1)
+    elif len(y) == 2:
+        fmt = fmt.replace('yy', '%y', 1)
+    else:
+        raise ValueError('Invalid format string, year must have 2 or 4 digits')
+    if len(m) == 2:
+        fmt = fmt.replace('mm', '%m', 1)
+    elif len(m) == 1:
+        fmt = fmt.replace('m', 'X%m', 1)
+    else:
+        raise ValueError('Invalid format string, month must have 1 or 2 digits')
+    if len(d) == 2:
+        fmt = fmt.replace('dd', '%d', 1)
+    elif len(d) == 1:
+        fmt = fmt.replace('d', 'X%d', 1)
+    else:
+        raise ValueError('Invalid format string, day must have 1 or 2 digits')
+    return date.strftime(fmt).replace('X0','X').replace('X','')
+
+
+def bench_date_formatter():
+    '''
+    Formatting a list of dates with the original date2datestr, with the
+    current date2datestr and with one DateFormatter.
+    '''
+    dates = _weekdays(5000)
+    for fmt in ('yyyymmdd', 'd-m-yy', 'mm/dd/yyyy'):
+        t_ref = _time(lambda: [_original_date2datestr(d, fmt) 
+                for d in dates])
+        t_call = _time(lambda: [du.date2datestr(d, fmt) for d in dates])
+        t_new = _time(lambda: du.DateFormatter(fmt).format_many(dates))
+        _report('date2datestr, {}'.format(fmt), t_ref / len(dates),
+                t_call / len(dates))
+        _report('DateFormatter.format_many, {}'.format(fmt),
+                t_ref / len(dates), t_new / len(dates))
+
+
+def _original_time2timestr(time, fmt='hhmmss'):
+    '''
+    The original time2timestr: validates the format and calls strftime for
+    every time.
+    '''
+    if fmt.count(':') == 2:
+        if not fmt.index('h') < fmt.index('m') < fmt.index('s'):
+            raise ValueError('Invalid format string. {}'.format(
+                    du.VALID_TIME_FORMATS_TEXT))
+        h, m, s = fmt.split(':')
+    elif fmt.count(':') == 1:
+        if not fmt.index('h') < fmt.index('m'):
+            raise ValueError('Invalid format string. {}'.format(
+                    du.VALID_TIME_FORMATS_TEXT))
+        h, m = fmt.split(':')
+        s = None
+    elif any(c not in 'hms' for c in fmt) or len(fmt) != 6:
+        raise ValueError('Invalid character in format string. {}'.format(
+                du.VALID_TIME_FORMATS_TEXT))
+    else:
+        if not fmt.index('h') < fmt.index('m') < fmt.index('s'):
+            raise ValueError('Invalid format string. {}'.format(
+                    du.VALID_TIME_FORMATS_TEXT))
+        h, m, s = fmt[:-4], fmt[-4:-2], fmt[-2:]
+    for string, char in ((h, 'h'), (m, 'm'), (s, 's')):
+        if string is not None and any(c != char for c in string):
+            raise ValueError('Invalid date format: {} is not {}'.\
+                    format(char, string))
+    if len(h) == 2:
+        fmt = fmt.replace('hh', '%H', 1)
+    elif len(h) == 1:
+        fmt = fmt.replace('h', 'X%H', 1)
+    else:
+        raise ValueError('Invalid format string, hour must have 1 or 2 digits')
+    if len(m) == 2:
+        fmt = fmt.replace('mm', '%M', 1)
+    else:
+        raise ValueError('Invalid format string, minutes must have 2 digits')
+    if s is not None and len(s) == 2:
+        fmt = fmt. replace('ss', '%S', 1)
+    elif s is not None:
+        raise ValueError('Invalid format string, seconds must have 2 digits')
+    return time.strftime(fmt).replace('X0','X').replace('X','')
+
+
+def bench_time_parser_formatter():
+    '''
+    Parsing and formatting tick times with timestr2time/time2timestr and with
+    a TimeParser/TimeFormatter. Formatting is compared with the original
+    time2timestr.
+    '''
+    times = [dt.time(random.randint(0, 23), random.randint(0, 59),
+            random.randint(0, 59)) for unused in range(5000)]
+    for fmt in ('hhmmss', 'hh:mm:ss', 'h:mm'):
+        formatter = du.TimeFormatter(fmt)
+        time_strs = formatter.format_many(times)
+        t_ref = _time(lambda: [du.timestr2time(s) for s in time_strs])
+        t_new = _time(lambda: du.TimeParser(fmt).parse_many(time_strs))
+        _report('TimeParser.parse_many, {}'.format(fmt), 
+                t_ref / len(times), t_new / len(times))
+        t_ref = _time(lambda: [_original_time2timestr(t, fmt) 
+                for t in times])
+        t_call = _time(lambda: [du.time2timestr(t, fmt) for t in times])
+        t_new = _time(lambda: du.TimeFormatter(fmt).format_many(times))
+        _report('time2timestr, {}'.format(fmt), t_ref / len(times),
+                t_call / len(times))
+        _report('TimeFormatter.format_many, {}'.format(fmt), 
+                t_ref / len(times), t_new / len(times))
+
+
+def bench_add_weekdays():
+    '''
+    Adding business days by stepping with next_weekday and with add_weekdays,
+    without and with a holiday calendar, and counting business days with a
+    large set of holidays, sorted per call and indexed once.
+    '''
+    date = dt.date(2013, 4, 10)
+    holidays = du.DateList(_weekdays(250 * 20, dt.date(2010, 1, 1))[::25])
+    for n_days in (5, 250, 2500):
+        def step(date=date):
+            for unused in range(n_days):
+                date = du.next_weekday(date)
+            return date
+        t_ref = _time(step, number=10)
+        t_new = _time(lambda: du.add_weekdays(date, n_days), number=1000)
+        t_hol = _time(lambda: du.add_weekdays(date, n_days, holidays),
+                number=1000)
+        _report('add_weekdays, {} days'.format(n_days), t_ref, t_new)
+        _report('add_weekdays, {} days, holidays'.format(n_days), t_ref,
+                t_hol)
+    many_holidays = set(_weekdays(100000, dt.date(1700, 1, 1)))
+    calendar = du.HolidayCalendar(many_holidays)
+    todate = date + dt.timedelta(days=100000)
+    t_ref = _time(lambda: _weekdays_between_sorted(date, todate, 
+            many_holidays))
+    t_new = _time(lambda: du.weekdays_between(date, todate, calendar),
+            number=1000)
+    _report('weekdays_between, 100000 holidays', t_ref, t_new)
+
+
+def _weekdays_between_sorted(fromdate, todate, holidays):
+    '''
+    The reference for weekdays_between with holidays: the holidays are
+    sorted and the holidays on weekdays in the range are counted per call.
+    '''
+    holidays = sorted(holidays)
+    i_from = bisect.bisect_right(holidays, fromdate)
+    i_to = bisect.bisect_right(holidays, todate)
+    return du.weekdays_between(fromdate, todate) - sum(1 for i in 
+            range(i_from, i_to) if holidays[i].weekday() < 5)
+
+
+def bench_weekday_many():
+    '''
+    Classifying a column of dates with is_weekday and is_weekday_many.
+    '''
+    dates = [dt.date(1990, 1, 1) + dt.timedelta(days=n) 
+            for n in range(100000)]
+    t_ref = _time(lambda: [du.is_weekday(d) for d in dates])
+    t_new = _time(lambda: du.is_weekday_many(dates))
+    _report('is_weekday_many, 100000 dates', t_ref, t_new)
+    compact = du.CompactDateList(dates, sort=False)
+    t_new = _time(lambda: du.is_weekday_many(compact))
+    _report('is_weekday_many, CompactDateList', t_ref, t_new)
+    if du.numpy is not None:
+        days = du.numpy.array(dates, dtype='datetime64[D]')
+        t_new = _time(lambda: du.is_weekday_many(days))
+        _report('is_weekday_many, datetime64 array', t_ref, t_new)
+    t_ref = _time(lambda: [du.next_weekday(d) for d in dates])
+    t_new = _time(lambda: du.next_weekday_many(dates))
+    _report('next_weekday_many, 100000 dates', t_ref, t_new)
+
+
+def bench_decstr2int_many():
+    '''
+    Converting a column of prices to integer cents.
+    '''
+    dec_strs = ['{}.{}'.format(random.randint(0, 10000), random.randint(0, 
+            999)) for unused in range(100000)]
+    for decimals in (2, 4):
+        t_ref = _time(lambda: [su.decstr2int(s, decimals) for s in dec_strs])
+        t_new = _time(lambda: list(su.decstr2int_many(dec_strs, decimals)))
+        _report('decstr2int_many, {} decimals'.format(decimals),
+                t_ref / len(dec_strs), t_new / len(dec_strs))
+
+
+def bench_random_strings():
+    '''
+    Generating random strings one by one with random_string and in bulk.
+    '''
+    charset = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+    for count, length in ((100000, 8), (10000, 32)):
+        t_ref = _time(lambda: [su.random_string(length, charset) 
+                for unused in range(count)])
+        t_new = _time(lambda: su.random_strings(count, length, charset))
+        t_secure = _time(lambda: su.random_strings(count, length, charset,
+                secure=True))
+        _report('random_strings, {} x {}'.format(count, length), t_ref, 
+                t_new)
+        _report('random_strings, {} x {}, secure'.format(count, length),
+                t_ref, t_secure)
+
+
+def bench_safe_eval_cache():
+    '''
+    Parsing repeated literal strings with and without the literal cache.
+    '''
+    literals = ["('price', 'gt', {})".format(n) for n in range(50)] + \
+            ["{{'a': {}, 'b': 'xyz', 'c': 2.5}}".format(n) for n in range(50)]
+    strs = [random.choice(literals) for unused in range(10000)]
+    maxsize = su.literal_cache.maxsize
+    su.literal_cache.maxsize = 0
+    t_ref = _time(lambda: [su.safe_eval(s) for s in strs])
+    su.literal_cache.maxsize = maxsize
+    t_new = _time(lambda: [su.safe_eval(s) for s in strs])
+    _report('safe_eval, cached', t_ref / len(strs), t_new / len(strs))
+
+
+def bench_safe_eval_fast():
+    '''
+    Parsing rule and dict strings with the ast and the fast safe_eval engine,
+    without caching.
+    '''
+    literals = (
+        ('rule', "(('price', 'gt', 10.5), 'and', ('side', 'eq', 'buy'))"),
+        ('tuple', "('a', 4, -1.5, True, None)"),
+        ('dict', "{'a': 1, 'b': 'xyz', 'c': 2.5, 'd': -4}"),
+        ('large dict', repr(dict(('key{}'.format(n), n * 1.5) 
+            for n in range(100)))),
+        )
+    maxsize = su.literal_cache.maxsize
+    su.literal_cache.maxsize = 0
+    for label, literal in literals:
+        t_ref = _time(lambda: su.safe_eval(literal, 'ast'), number=1000)
+        t_new = _time(lambda: su.safe_eval(literal, 'fast'), number=1000)
+        _report('safe_eval fast, {}'.format(label), t_ref, t_new)
+    su.literal_cache.maxsize = maxsize
+
+
+def bench_str2dict_items():
+    '''
+    Getting the sorted keys and values of a large (cached) dict string, via
+    str2dict and via str2dict_items.
+    '''
+    literal = repr(dict(('key{}'.format(n), n * 1.5) for n in range(10000)))
+    su.safe_eval(literal)
+
+    def reference():
+        tmp_dict = su.str2dict(literal)
+        keys = sorted([k for k in tmp_dict])
+        tmp_dict = su.str2dict(literal)
+        return keys, [tmp_dict[key] for key in sorted(k for k in tmp_dict)]
+
+    t_ref = _time(reference, number=10)
+    t_new = _time(lambda: su.str2dict_items(literal), number=10)
+    _report('str2dict keys and values', t_ref, t_new)
+
+
+def _month_subset(dates, date):
+    '''
+    The dates of the month of <date> with subset, the way it had to be done
+    without the period methods.
+    '''
+    first = date.replace(day=1)
+    last = (first + dt.timedelta(days=32)).replace(day=1) - du.DateList.ONE_DAY
+    return dates.subset(first, last)
+
+
+def bench_datelist_periods():
+    '''
+    First and last trading day of the month on a 40 year trading calendar,
+    with subset and with the cached period boundaries.
+    '''
+    dates = du.DateList(_weekdays(10000))
+    queries = random.sample(dates, 100)
+
+    def reference():
+        for date in queries:
+            month = _month_subset(dates, date)
+            month[0], month[-1]
+
+    def new():
+        for date in queries:
+            dates.first_of_period(date, 'month')
+            dates.last_of_period(date, 'month')
+
+    t_ref = _time(reference, number=100)
+    t_new = _time(new, number=100)
+    _report('DateList first/last of month', t_ref / len(queries),
+            t_new / len(queries))
+
+
+def bench_datelist_append():
+    '''
+    Adding a date to a 40 year trading calendar, by re-sorting a new DateList
+    and by DateList.append.
+    '''
+    dates = du.DateList(_weekdays(10000))
+    new_dates = random.sample(dates, 100)
+
+    def reference():
+        datelist = dates
+        for date in new_dates:
+            datelist = du.DateList(datelist + [date])
+
+    def new():
+        datelist = du.DateList(dates, sort=False)
+        for date in new_dates:
+            datelist.append(date)
+
+    t_ref = _time(reference)
+    t_new = _time(new)
+    _report('DateList add a date', t_ref / len(new_dates),
+            t_new / len(new_dates))
+
+
+def bench_offset_many():
+    '''
+    DateList.offset and delta for the rows of a signal table, one by one and
+    with offset_many and delta_many, with and without numpy.
+    '''
+    dates = du.DateList(_weekdays(10000))
+    compact = du.CompactDateList(dates)
+    span = (dates[-1] - dates[0]).days
+    queries = [dates[0] + dt.timedelta(days=random.randint(0, span))
+            for unused in range(10000)]
+    du_numpy = du.numpy
+    for numpy_label, numpy_module in (('numpy', du_numpy), ('python', None)):
+        if numpy_label == 'numpy' and du_numpy is None:
+            continue
+        du.numpy = numpy_module
+        for label, datelist in (('DateList', dates),
+                ('CompactDateList', compact)):
+            t_ref = _time(lambda: [datelist.offset(date, 5)
+                    for date in queries])
+            t_new = _time(lambda: datelist.offset_many(queries, 5))
+            _report('{}.offset_many, {}'.format(label, numpy_label),
+                    t_ref / len(queries), t_new / len(queries))
+            t_ref = _time(lambda: [datelist.delta(date, queries[0])
+                    for date in queries])
+            t_new = _time(lambda: datelist.delta_many(queries,
+                    [queries[0]] * len(queries)))
+            _report('{}.delta_many, {}'.format(label, numpy_label),
+                    t_ref / len(queries), t_new / len(queries))
+    du.numpy = du_numpy
+
+
+def bench_subset_view():
+    '''
+    Nested subset queries on a 40 year trading calendar: copying and
+    re-wrapping the slices (as callers had to do when subset returned a
+    list) and with DateListView.
+    '''
+    dates = du.DateList(_weekdays(10000))
+    windows = []
+    for unused in range(100):
+        i_from = random.randint(0, 5000)
+        windows.append((dates[i_from], dates[i_from + 2500],
+                dates[i_from + 1000], dates[i_from + 1500]))
+
+    def reference():
+        for fromdate, todate, inner_from, inner_to in windows:
+            outer = du.DateList(dates[dates.index(fromdate):
+                    dates.index(todate) + 1])
+            inner = du.DateList(outer[outer.index(inner_from):
+                    outer.index(inner_to) + 1])
+            inner.on_or_before(inner_to)
+
+    def new():
+        for fromdate, todate, inner_from, inner_to in windows:
+            inner = dates.subset(fromdate, todate).subset(inner_from,
+                    inner_to)
+            inner.on_or_before(inner_to)
+
+    t_ref = _time(reference)
+    t_new = _time(new, number=10)
+    _report('nested subset', t_ref / len(windows), t_new / len(windows))
+
+
+def bench_windows():
+    '''
+    Rolling 20 date and 30 calendar day windows over a 40 year trading
+    calendar, with subset per anchor date and with the window generators.
+    '''
+    dates = du.DateList(_weekdays(10000))
+    t_ref = _time(lambda: [len(dates.subset(date, dates.offset(date, 19)))
+            for date in dates[:-19]])
+    t_new = _time(lambda: [len(window) for window in dates.windows(20)])
+    _report('DateList.windows', t_ref / len(dates), t_new / len(dates))
+    span = dt.timedelta(days=30)
+    t_ref = _time(lambda: [len(dates.subset(date - span + du.DateList.ONE_DAY,
+            date)) for date in dates])
+    t_new = _time(lambda: [len(window)
+            for window in dates.windows_by_calendar(span)])
+    _report('DateList.windows_by_calendar', t_ref / len(dates),
+            t_new / len(dates))
+
+
+def bench_datelist_load():
+    '''
+    Building a 40 year trading calendar from date strings and loading it from
+    a file written by save.
+    '''
+    dates = du.DateList(_weekdays(10000))
+    date_strs = [du.date2datestr(date, 'yyyymmdd') for date in dates]
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'dates.bin')
+        dates.save(path)
+        t_ref = _time(lambda: du.DateList([du.datestr2date(date_str)
+                for date_str in date_strs]))
+        t_new = _time(lambda: du.CompactDateList.load(path), number=100)
+        _report('DateList load', t_ref, t_new)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def bench_convert_many():
+    '''
+    Converting 1 million decimal strings and 1 million time strings with
+    convert_many with 1 to <number of cpus> workers, the reference is the
+    scalar converter in one process.
+    '''
+    dec_strs = ['{}.{:02}'.format(random.randint(0, 100000),
+            random.randint(0, 99)) for unused in range(1000000)]
+    time_strs = ['{:02}:{:02}:{:02}'.format(random.randint(0, 23),
+            random.randint(0, 59), random.randint(0, 59))
+            for unused in range(1000000)]
+    n_cpus = pu.multiprocessing.cpu_count()
+    for converter, strs, args, scalar in (
+            ('decstr2int', dec_strs, (2,), lambda s: su.decstr2int(s, 2)),
+            ('timestr2time', time_strs, (), du.timestr2time)):
+        t_ref = _time(lambda: [scalar(s) for s in strs], repeat=1)
+        for workers in sorted(set([1, 2, 4, 8, n_cpus])):
+            if workers > n_cpus:
+                continue
+            t_new = _time(lambda: list(pu.convert_many(strs, converter, args,
+                    workers=workers)), repeat=1)
+            _report('convert_many {}, {} workers'.format(converter, workers),
+                    t_ref / len(strs), t_new / len(strs))
+
+
+def bench_date_table():
+    '''
+    Formatting and parsing 100000 dates from a 10 year trading calendar,
+    with date2datestr/datestr2date and with a DateTable (after use).
+    '''
+    calendar = _weekdays(2600, dt.date(2010, 1, 1))
+    dates = [random.choice(calendar) for unused in range(100000)]
+    date_strs = [du.date2datestr(date, 'd-m-yyyy') for date in dates]
+    table = du.DateTable('d-m-yyyy', dt.date(2010, 1, 1),
+            dt.date(2019, 12, 31))
+    table.format_many(calendar)
+    t_format = _time(lambda: [du.date2datestr(date, 'd-m-yyyy')
+            for date in dates])
+    t_new = _time(lambda: table.format_many(dates))
+    _report('DateTable.format_many', t_format / len(dates),
+            t_new / len(dates))
+    t_ref = _time(lambda: [du.datestr2date(date_str)
+            for date_str in date_strs])
+    t_new = _time(lambda: table.parse_many(date_strs))
+    _report('DateTable.parse_many', t_ref / len(dates), t_new / len(dates))
+    du.use_date_table('d-m-yyyy', dt.date(2010, 1, 1), dt.date(2019, 12, 31))
+    try:
+        t_new = _time(lambda: [du.date2datestr(date, 'd-m-yyyy')
+                for date in dates])
+        _report('date2datestr, use_date_table', t_format / len(dates),
+                t_new / len(dates))
+    finally:
+        du.clear_date_tables()
+
+
+def _compile_eager(conditions):
+    '''
+    compile_conditions as it was before short-circuiting and flattening:
+    both arguments of 'and' and 'or' are always evaluated.
+    '''
+    arg1, op, arg2 = conditions
+    get_arg1 = _eager_argument(arg1)
+    get_arg2 = _eager_argument(arg2)
+    if op in mu.COMPARISON_OPERATORS:
+        compare = getattr(operator, op)
+        def evaluate(data={}):
+            arg1 = get_arg1(data)
+            arg2 = get_arg2(data)
+            if not (type(arg1) in (float, int) and type(arg2) in (float,int))\
+                    and type(arg1) != type(arg2):
+                raise TypeError()
+            return compare(arg1, arg2)
+    else:
+        combine = getattr(operator, op + '_')
+        def evaluate(data={}):
+            arg1 = get_arg1(data)
+            arg2 = get_arg2(data)
+            if not isinstance(arg1, bool) or not isinstance(arg2, bool):
+                raise TypeError()
+            return combine(arg1, arg2)
+    return evaluate
+
+
+def _eager_argument(arg):
+    if isinstance(arg, tuple):
+        evaluate = _compile_eager(arg)
+        return lambda data: data[arg] if arg in data else evaluate(data)
+    return lambda data: data[arg] if arg in data else arg
+
+
+def bench_eval_conditions_rules():
+    '''
+    Evaluating a deep rule (an 'and' chain of 8 conditions, where the first
+    condition is usually False) and an 'or' of 2 such chains, with eager
+    evaluation and with short-circuiting, flattened conditions.
+    '''
+    records = [dict(('v{}'.format(i), random.randint(0, 9)) for i in range(8))
+            for unused in range(1000)]
+    chain = ('v7', 'ge', 1)
+    for i in range(6, -1, -1):
+        chain = (('v{}'.format(i), 'ge', 8 if i == 0 else 1), 'and', chain)
+    for label, conditions in (('and chain', chain),
+            ('or of chains', (chain, 'or', (('v1', 'eq', 3), 'and', chain)))):
+        eager = _compile_eager(conditions)
+        evaluate = mu.compile_conditions(conditions)
+        t_ref = _time(lambda: [eager(data) for data in records])
+        t_new = _time(lambda: [evaluate(data) for data in records])
+        _report('rule, {}'.format(label), t_ref / len(records),
+                t_new / len(records))
+
+
+def bench_rule_set():
+    '''
+    Finding the matching rules among 500 routing rules (by country, by
+    amount range and a few unindexed rules with a shared condition) for a
+    record, with a loop of compiled conditions and with a RuleSet.
+    '''
+    countries = ['C{}'.format(i) for i in range(100)]
+    shared = ('amount', 'gt', ('limit', 'mul', 2))
+    rules = []
+    for i in range(500):
+        if i % 50 == 0:
+            conditions = (shared, 'or', ('country', 'in', countries[:i]))
+        elif i % 2:
+            conditions = (('country', 'eq', countries[i % 100]), 'and', 
+                    ('amount', 'ge', i))
+        else:
+            conditions = ((i * 10, 'le', 'amount'), 'and', 
+                    ('amount', 'lt', i * 10 + 20))
+        rules.append(('rule{}'.format(i), conditions))
+    records = [{'country': random.choice(countries), 
+            'amount': random.randint(0, 5000), 'limit': 2000} 
+            for unused in range(1000)]
+    compiled = [(rule_id, mu.compile_conditions(conditions)) 
+            for rule_id, conditions in rules]
+    rule_set = mu.RuleSet(rules)
+    t_ref = _time(lambda: [[rule_id for rule_id, evaluate in compiled 
+            if evaluate(data)] for data in records])
+    t_new = _time(lambda: rule_set.match_many(records))
+    _report('500 rules, per record', t_ref / len(records), 
+            t_new / len(records))
+
+
+def bench_div_many():
+    '''
+    Dividing 100000 pairs (10% with a zero denominator) with div per pair and
+    with div_many, with numpy arrays and with lists, and evaluating a ratio
+    condition for the same table row by row and in one call.
+    '''
+    n_pairs = 100000
+    numerators = [random.randint(0, 3) for unused in range(n_pairs)]
+    denominators = [random.randint(0, 9) for unused in range(n_pairs)]
+    t_ref = _time(lambda: [mu.div(n, d) for n, d in 
+            zip(numerators, denominators)])
+    if mu.numpy is not None:
+        arrays = (mu.numpy.array(numerators), mu.numpy.array(denominators))
+        t_new = _time(lambda: mu.div_many(*arrays))
+        _report('div_many, numpy arrays', t_ref, t_new)
+    mu_numpy = mu.numpy
+    mu.numpy = None
+    try:
+        t_new = _time(lambda: mu.div_many(numerators, denominators))
+    finally:
+        mu.numpy = mu_numpy
+    _report('div_many, lists', t_ref, t_new)
+    conditions = (('a', 'truediv', 'b'), 'gt', 0.5)
+    columns = {'a': numerators, 'b': denominators}
+    records = [{'a': n, 'b': d} for n, d in zip(numerators, denominators)]
+    t_ref = _time(lambda: [mu.eval_conditions(conditions, data)
+            for data in records])
+    t_new = _time(lambda: mu.eval_conditions_many(conditions, columns))
+    _report('eval_conditions_many, truediv', t_ref, t_new)
+
+
+BENCHMARKS = (
+    ('datelist_index', bench_datelist_index),
+    ('compile_conditions', bench_compile_conditions),
+    ('eval_conditions_many', bench_eval_conditions_many),
+    ('datestr2date_many', bench_datestr2date_many),
+    ('date_formatter', bench_date_formatter),
+    ('time_parser_formatter', bench_time_parser_formatter),
+    ('add_weekdays', bench_add_weekdays),
+    ('weekday_many', bench_weekday_many),
+    ('decstr2int_many', bench_decstr2int_many),
+    ('random_strings', bench_random_strings),
+    ('safe_eval_cache', bench_safe_eval_cache),
+    ('safe_eval_fast', bench_safe_eval_fast),
+    ('str2dict_items', bench_str2dict_items),
+    ('datelist_periods', bench_datelist_periods),
+    ('datelist_append', bench_datelist_append),
+    ('offset_many', bench_offset_many),
+    ('subset_view', bench_subset_view),
+    ('windows', bench_windows),
+    ('datelist_load', bench_datelist_load),
+    ('convert_many', bench_convert_many),
+    ('date_table', bench_date_table),
+    ('eval_conditions_rules', bench_eval_conditions_rules),
+    ('rule_set', bench_rule_set),
+    ('div_many', bench_div_many),
+    )
+
+
+def main(names=None):
+    '''
+    Runs the benchmarks in <names>, or all benchmarks if no names are given.
+    '''
+    random.seed(0)
+    print('{:<40} {:>15} {:>15} {:>11}'.format('', 'reference', 'new',
+            'speedup'))
+    for name, benchmark in BENCHMARKS:
+        if not names or name in names:
+            benchmark()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -20,7 +20,20 @@ along with this program.  If not, see `<http://www.gnu.org/licenses/>`.
 from __future__ import division
 from __future__ import absolute_import
 
+import array
+import bisect
 import datetime
+import functools
+import itertools
+import mmap
+import string
+import struct
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 VALID_DATE_FORMATS_TEXT = '''The following date formats are valid:
@@ -78,10 +91,106 @@ def datestr2date(date_str):
         else:
             raise ValueError('m and d must be 1 or 2 digits')
     try:
-        return datetime.date(year, month, day)
+        date = datetime.date(year, month, day)
     except ValueError:
         raise ValueError('Invalid date {}. {}'.format(date_str, 
                 VALID_DATE_FORMATS_TEXT))
+    return date
+
+
+def datestr2date_many(date_strs):
+    '''
+    Turns strings into datetime.date objects, like datestr2date. The format is
+    detected from the first string and the other strings are parsed with a
+    parser for that format. A string that does not have the detected format
+    is parsed (or rejected) by datestr2date. Repeated strings are only parsed
+    once.
+
+    Args:
+        date_strs (iterable) of strings that represent dates
+    Returns:
+        (generator) of datetime.date objects
+    Raises:
+        ValueError if a string does not have a valid format.
+    '''
+    dates = {}
+    parse = None
+    for date_str in date_strs:
+        date = dates.get(date_str)
+        if date is None:
+            if parse is None:
+                parse = _date_parser(date_str)
+            date = parse(date_str) or datestr2date(date_str)
+            dates[date_str] = date
+        yield date
+
+
+def _date_parser(date_str):
+    '''
+    Returns the parser for the format of date_str. A parser returns None if a
+    string does not have its format.
+    '''
+    if '/' in date_str:
+        return _parse_mdy
+    elif '-' in date_str:
+        return _parse_dmy
+    elif len(date_str) == 8:
+        return _parse_yyyymmdd
+    elif len(date_str) == 6:
+        return _parse_yymmdd
+    return datestr2date
+
+
+def _parse_yyyymmdd(date_str):
+    '''
+    Parser for the yyyymmdd format.
+    '''
+    if len(date_str) == 8:
+        return _make_date(date_str[:4], date_str[4:6], date_str[6:])
+
+
+def _parse_yymmdd(date_str):
+    '''
+    Parser for the yymmdd format.
+    '''
+    if len(date_str) == 6:
+        return _make_date(date_str[:2], date_str[2:4], date_str[4:])
+
+
+def _parse_dmy(date_str):
+    '''
+    Parser for the d-m-yy and d-m-yyyy formats.
+    '''
+    parts = date_str.split('-')
+    if len(parts) == 3:
+        d, m, y = parts
+        return _make_date(y, m, d)
+
+
+def _parse_mdy(date_str):
+    '''
+    Parser for the m/d/yy and m/d/yyyy formats.
+    '''
+    parts = date_str.split('/')
+    if len(parts) == 3:
+        m, d, y = parts
+        return _make_date(y, m, d)
+
+
+def _make_date(y, m, d):
+    '''
+    Returns the date for the year, month and day strings, or None if they are
+    not valid.
+    '''
+    # only ascii digits, isdigit is also True for other digits, which
+    # datestr2date does not accept
+    if (len(y) == 4 or len(y) == 2) and 1 <= len(m) <= 2 and \
+            1 <= len(d) <= 2 and not (y + m + d).strip(string.digits):
+        try:
+            year = int(y) if len(y) == 4 else 2000 + int(y)
+            return datetime.date(year, int(m), int(d))
+        except ValueError:
+            pass
 
 
 def date2datestr(date, fmt='yyyymmdd'):
@@ -98,47 +207,222 @@ def date2datestr(date, fmt='yyyymmdd'):
     Raises:
         ValueError if the format is not valid.
     '''
-    if '-' in fmt:
-        if not fmt.index('d') < fmt.index('m') < fmt.index('y'):
-            raise ValueError('Invalid format string. {}'.format(
-                    VALID_DATE_FORMATS_TEXT))
-        d, m, y = fmt.split('-')
-    elif '/' in fmt:
-        if not fmt.index('m') < fmt.index('d') < fmt.index('y'):
-            raise ValueError('Invalid format string. {}'.format(
-                    VALID_DATE_FORMATS_TEXT))
-        m, d, y = fmt.split('/')
-    elif any(c not in 'dmy' for c in fmt):
-        raise ValueError('Invalid character in format string. {}'.format(
-                VALID_DATE_FORMATS_TEXT))
-    else:
-        if not fmt.index('y') < fmt.index('m') < fmt.index('d'):
-            raise ValueError('Invalid format string. {}'.format(
+    formatter = _date_formatters.get(fmt)
+    if formatter is None:
+        formatter = _date_formatters[fmt] = DateFormatter(fmt)
+    return formatter.format(date)
+
+
+class DateFormatter(object):
+    '''
+    Turns datetime.date objects into strings with one format. The format
+    is validated once, so use this instead of date2datestr to format many
+    dates.
+    '''
+
+    def __init__(self, fmt='yyyymmdd'):
+        '''
+        Constructor validates the format string, which must have one of the
+        formats from VALID_DATE_FORMATS_TEXT.
+
+        Raises:
+            ValueError if the format is not valid.
+        '''
+        if '-' in fmt:
+            if not fmt.index('d') < fmt.index('m') < fmt.index('y'):
+                raise ValueError('Invalid format string. {}'.format(
+                        VALID_DATE_FORMATS_TEXT))
+            d, m, y = fmt.split('-')
+        elif '/' in fmt:
+            if not fmt.index('m') < fmt.index('d') < fmt.index('y'):
+                raise ValueError('Invalid format string. {}'.format(
+                        VALID_DATE_FORMATS_TEXT))
+            m, d, y = fmt.split('/')
+        elif any(c not in 'dmy' for c in fmt):
+            raise ValueError('Invalid character in format string. {}'.format(
                     VALID_DATE_FORMATS_TEXT))
-        y, m, d = fmt[:-4], fmt[-4:-2], fmt[-2:]
-    for string, char in ((d, 'd'), (m, 'm'), (y, 'y')):
-        if any(c != char for c in string):
-            raise ValueError('Invalid date format: {} is not {}'.\
-                    format(char, string))
-    if len(y) == 4:
-        fmt = fmt.replace('yyyy', '%Y', 1)
-    elif len(y) == 2:
-        fmt = fmt.replace('yy', '%y', 1)
-    else:
-        raise ValueError('Invalid format string, year must have 2 or 4 digits')
-    if len(m) == 2:
-        fmt = fmt.replace('mm', '%m', 1)
-    elif len(m) == 1:
-        fmt = fmt.replace('m', 'X%m', 1)
-    else:
-        raise ValueError('Invalid format string, month must have 1 or 2 digits')
-    if len(d) == 2:
-        fmt = fmt.replace('dd', '%d', 1)
-    elif len(d) == 1:
-        fmt = fmt.replace('d', 'X%d', 1)
-    else:
-        raise ValueError('Invalid format string, day must have 1 or 2 digits')
-    return date.strftime(fmt).replace('X0','X').replace('X','')
+        else:
+            if not fmt.index('y') < fmt.index('m') < fmt.index('d'):
+                raise ValueError('Invalid format string. {}'.format(
+                        VALID_DATE_FORMATS_TEXT))
+            y, m, d = fmt[:-4], fmt[-4:-2], fmt[-2:]
+        for string, char in ((d, 'd'), (m, 'm'), (y, 'y')):
+            if any(c != char for c in string):
+                raise ValueError('Invalid date format: {} is not {}'.\
+                        format(char, string))
+        if len(y) == 4:
+            year = '%04d'
+        elif len(y) == 2:
+            year = '%02d'
+        else:
+            raise ValueError(
+                    'Invalid format string, year must have 2 or 4 digits')
+        if len(m) == 2:
+            month = '%02d'
+        elif len(m) == 1:
+            month = '%d'
+        else:
+            raise ValueError(
+                    'Invalid format string, month must have 1 or 2 digits')
+        if len(d) == 2:
+            day = '%02d'
+        elif len(d) == 1:
+            day = '%d'
+        else:
+            raise ValueError(
+                    'Invalid format string, day must have 1 or 2 digits')
+        self.fmt = fmt
+        # a %-format pattern and a function that returns its values
+        modulo = 10 ** len(y)
+        if '-' in fmt:
+            self._pattern = '-'.join((day, month, year))
+            self._values = lambda date: (date.day, date.month,
+                    date.year % modulo)
+        elif '/' in fmt:
+            self._pattern = '/'.join((month, day, year))
+            self._values = lambda date: (date.month, date.day,
+                    date.year % modulo)
+        else:
+            self._pattern = ''.join((year, month, day))
+            self._values = lambda date: (date.year % modulo, date.month,
+                    date.day)
+
+    def format(self, date):
+        '''
+        Returns the string that represents <date>.
+        '''
+        return self._pattern % self._values(date)
+
+    def format_many(self, dates):
+        '''
+        Returns a list with the strings that represent <dates>.
+        '''
+        pattern = self._pattern
+        values = self._values
+        return [pattern % values(date) for date in dates]
+
+
+# DateFormatter objects by format, used by date2datestr
+_date_formatters = {}
+
+
+class DateTable(object):
+    '''
+    A cache for formatting and parsing the dates from <first> to <last> with
+    one format. The strings are stored in a list indexed by the ordinal of
+    the date, so formatting a date in the range is a list lookup, and the
+    dates are stored in a dict by string. Both are filled when a date is
+    formatted or parsed for the first time.
+    Use use_date_table to make date2datestr use a table, and parse or
+    parse_many to parse strings with it.
+    '''
+
+    def __init__(self, fmt='yyyymmdd', first=datetime.date(1970, 1, 1),
+            last=datetime.date(2069, 12, 31)):
+        '''
+        Constructor validates the format string, which must have one of the
+        formats from VALID_DATE_FORMATS_TEXT.
+
+        Raises:
+            ValueError if the format is not valid, or last is before first.
+        '''
+        if last < first:
+            raise ValueError('last must not be before first')
+        self.formatter = DateFormatter(fmt)
+        self.fmt = fmt
+        self.first = first
+        self.last = last
+        self._offset = first.toordinal()
+        self._size = last.toordinal() - self._offset + 1
+        self._strs = [None] * self._size
+        self._dates = {}
+        if fmt.count('y') == 2:
+            # only these strings are parsed back to the same date
+            self._parsed_years = (2000, 2099)
+        else:
+            self._parsed_years = (1, 9999)
+
+    def format(self, date):
+        '''
+        Returns the string that represents <date>.
+        '''
+        index = date.toordinal() - self._offset
+        if 0 <= index < self._size:
+            date_str = self._strs[index]
+            if date_str is None:
+                date_str = self._add(date)
+            return date_str
+        return self.formatter.format(date)
+
+    def format_many(self, dates):
+        '''
+        Returns a list with the strings that represent <dates>.
+        '''
+        return [self.format(date) for date in dates]
+
+    def parse(self, date_str):
+        '''
+        Returns the datetime.date for <date_str>, like datestr2date.
+
+        Raises:
+            ValueError if date_str does not have a valid format.
+        '''
+        date = self._dates.get(date_str)
+        if date is None:
+            date = datestr2date(date_str)
+            self._add(date)
+        return date
+
+    def parse_many(self, date_strs):
+        '''
+        Returns a list with the datetime.date objects for <date_strs>.
+        '''
+        return [self.parse(date_str) for date_str in date_strs]
+
+    def _add(self, date):
+        '''
+        Stores the string for <date> and the date for the string, if the date
+        is in the range. Returns the string.
+        '''
+        ordinal = date.toordinal()
+        index = ordinal - self._offset
+        if not 0 <= index < self._size:
+            return None
+        date_str = self._strs[index]
+        if date_str is None:
+            date_str = self._strs[index] = self.formatter.format(date)
+            first_year, last_year = self._parsed_years
+            if first_year <= date.year <= last_year:
+                self._dates[date_str] = datetime.date.fromordinal(ordinal)
+        return date_str
+
+
+# DateTable objects by format, used by date2datestr
+_date_tables = {}
+
+
+def use_date_table(fmt='yyyymmdd', first=datetime.date(1970, 1, 1),
+        last=datetime.date(2069, 12, 31)):
+    '''
+    Makes date2datestr use a DateTable for <fmt> and the dates from <first>
+    to <last>. Returns the table, use its parse or parse_many methods to
+    parse strings with it.
+
+    Raises:
+        ValueError if the format is not valid, or last is before first.
+    '''
+    table = DateTable(fmt, first, last)
+    _date_tables[fmt] = _date_formatters[fmt] = table
+    return table
+
+
+def clear_date_tables():
+    '''
+    Stops date2datestr from using the tables of use_date_table.
+    '''
+    for fmt in _date_tables:
+        _date_formatters.pop(fmt, None)
+    _date_tables.clear()
 
 
 def is_weekday(date):
@@ -207,61 +491,315 @@ def next_weekday(date):
     return date + datetime.timedelta(days=n_days)
 
 
-def last_year(date_):
+def add_weekdays(date, n_days, holidays=None):
     '''
-    Returns the same date 1 year ago.
+    Returns the date n_days weekdays after (or before if n_days < 0) date,
+    e.g. add_weekdays(date, 1) is next_weekday(date). This is calculated
+    from whole weeks, so it doesn't step through the days.
 
     Args:
         date (datetime or datetime.date)
+        n_days (int) number of weekdays
+        holidays (HolidayCalendar or iterable) of dates that are skipped
+            like weekends. The HolidayCalendar of a DateList is cached, other
+            iterables are indexed on every call, so pass a HolidayCalendar
+            to use the same holidays many times.
     Returns:
         (datetime or datetime.date)
     Raises:
         -
     '''
-    day = 28 if date_.day == 29 and date_.month == 2 else date_.day
-    return datetime.date(date_.year-1, date_.month, day)
+    if n_days == 0:
+        return date
+    result = date + datetime.timedelta(days=_weekdays_offset(date.weekday(),
+            n_days))
+    if holidays:
+        calendar = _holiday_calendar(holidays)
+        # move on for the holidays that were passed, until none are passed
+        start = date
+        while True:
+            if n_days > 0:
+                n_holidays = calendar.count(start, result)
+            else:
+                # the holidays from result up to (not including) start
+                n_holidays = -calendar.count(result - _ONE_DAY,
+                        start - _ONE_DAY)
+            if not n_holidays:
+                break
+            start = result
+            result += datetime.timedelta(days=_weekdays_offset(
+                    result.weekday(), n_holidays))
+    return result
 
 
-class DateList(list):
+def weekdays_between(fromdate, todate, holidays=None):
     '''
-    Provides a list of dates with methods to extract information.
-    The dates list MUST be sorted for the methods of this class to work.
+    Returns the number of weekdays after <fromdate> up to and including
+    <todate>, or minus the number of weekdays after <todate> up to and
+    including <fromdate> if todate < fromdate. This is calculated from whole
+    weeks, so it doesn't step through the days.
+
+    Args:
+        fromdate (datetime or datetime.date)
+        todate (datetime or datetime.date)
+        holidays (iterable) of dates that are not counted, see add_weekdays
+    Returns:
+        (int)
+    Raises:
+        -
     '''
+    if todate < fromdate:
+        return -weekdays_between(todate, fromdate, holidays)
+    n_days = _weekdays_until(todate) - _weekdays_until(fromdate)
+    if holidays:
+        n_days -= _holiday_calendar(holidays).count(fromdate, todate)
+    return n_days
 
-    ONE_DAY = datetime.timedelta(days=1)
 
-    def __init__(self, dates, sort=True):
-        '''
-        Constructor stores the list of dates. The list will be sorted by
-        default, you can avoid sorting overhead if you are 100% sure the dates
-        list is sorted by specifying sort=False.
-        '''
-        if sort:
-            dates.sort()
-        list.__init__(self, dates)
+def weekday_range(fromdate, todate, holidays=None):
+    '''
+    Generates the weekdays from <fromdate> up to and including <todate>.
 
-    def index(self, date):
+    Args:
+        fromdate (datetime or datetime.date)
+        todate (datetime or datetime.date)
+        holidays (iterable) of dates that are skipped, see add_weekdays
+    Returns:
+        (generator) of dates
+    Raises:
+        -
+    '''
+    ordinals = _holiday_calendar(holidays)._ordinals if holidays else []
+    i_holiday = bisect.bisect_left(ordinals, fromdate.toordinal())
+    date = fromdate if is_weekday(fromdate) else next_weekday(fromdate)
+    while date <= todate:
+        ordinal = date.toordinal()
+        while i_holiday < len(ordinals) and ordinals[i_holiday] < ordinal:
+            i_holiday += 1
+        if i_holiday == len(ordinals) or ordinals[i_holiday] != ordinal:
+            yield date
+        date += _NEXT_WEEKDAY[date.weekday()]
+
+
+_ONE_DAY = datetime.timedelta(days=1)
+# the number of days to the previous/next weekday, by weekday
+_PREVIOUS_WEEKDAY_DAYS = (3, 1, 1, 1, 1, 1, 2)
+_NEXT_WEEKDAY_DAYS = (1, 1, 1, 1, 3, 2, 1)
+_NEXT_WEEKDAY = [datetime.timedelta(days=n) for n in _NEXT_WEEKDAY_DAYS]
+
+
+def _weekdays_offset(weekday, n_days):
+    '''
+    Returns the number of calendar days from a date with <weekday> to the
+    date n_days weekdays later (or earlier if n_days < 0).
+    '''
+    if n_days > 0:
+        # from a weekend, count from the Friday before
+        shift = min(4 - weekday, 0)
+        weeks, n_rest = divmod(n_days, 5)
+        days = 7 * weeks + n_rest
+        if weekday + shift + n_rest > 4:
+            days += 2
+        return shift + days
+    # from a weekend, count from the Monday after
+    shift = 7 - weekday if weekday > 4 else 0
+    weeks, n_rest = divmod(-n_days, 5)
+    days = 7 * weeks + n_rest
+    if (weekday + shift) % 7 - n_rest < 0:
+        days += 2
+    return shift - days
+
+
+def _weekdays_until(date):
+    '''
+    Returns the number of weekdays from 1-1-1 (a Monday) up to and including
+    <date>.
+    '''
+    weeks, n_rest = divmod(date.toordinal(), 7)
+    return 5 * weeks + min(n_rest, 5)
+
+
+class HolidayCalendar(object):
+    '''
+    An index of holidays for add_weekdays, weekdays_between and
+    weekday_range: the sorted day numbers of the holidays that are on a
+    weekday, without duplicates. The position of a day number in the list is
+    the number of holidays before it, so counting the holidays between 2
+    dates takes 2 bisects.
+    '''
+
+    def __init__(self, holidays=()):
+        self._ordinals = sorted(set(date.toordinal() for date in holidays
+                if date.weekday() < 5))
+
+    def __len__(self):
+        return len(self._ordinals)
+
+    def __contains__(self, date):
+        ordinal = date.toordinal()
+        index = bisect.bisect_left(self._ordinals, ordinal)
+        return index < len(self._ordinals) and \
+                self._ordinals[index] == ordinal
+
+    def count(self, fromdate, todate):
         '''
-        Overloads the default list.index, because of special behaviour if the
-        date is not in the list:
-            - If <date> is not in the list, the index of the latest date before
-                <date> is returned.
-            - If <date> is earlier than the earliest date in the list, the 
-                return value is 0
-            - If <date> is later than the latest date in self.dates the return
-                value is the index of the most recent date.
+        Returns the number of holidays on weekdays after <fromdate> up to and
+        including <todate>.
         '''
-        if date in self:
-            index = super(DateList, self).index(date)
-        elif date < self[0]:
-            index = 0
-        elif date > self[-1]:
-            index = len(self) - 1
-        else:
-            while date not in self:
-                date -= self.ONE_DAY
-            index = super(DateList, self).index(date)
-        return index
+        return bisect.bisect_right(self._ordinals, todate.toordinal()) - \
+                bisect.bisect_right(self._ordinals, fromdate.toordinal())
+
+
+def _holiday_calendar(holidays):
+    '''
+    Returns holidays as a HolidayCalendar, the calendar of a DateList or
+    CompactDateList is cached with the list.
+    '''
+    if isinstance(holidays, HolidayCalendar):
+        return holidays
+    if isinstance(holidays, _DateListMethods):
+        cache = holidays.__dict__.setdefault('_cache', {})
+        try:
+            return cache['holiday_calendar']
+        except KeyError:
+            calendar = cache['holiday_calendar'] = HolidayCalendar(holidays)
+            return calendar
+    return HolidayCalendar(holidays)
+
+
+def is_weekday_many(dates):
+    '''
+    Returns for each date if it is a weekday, like is_weekday. The weekdays
+    are calculated from the day numbers of the dates.
+
+    Args:
+        dates (sequence) of datetime.date objects, a CompactDateList or a
+            numpy datetime64 array
+    Returns:
+        (numpy.ndarray) of booleans, or (list) if numpy is not installed
+    Raises:
+        -
+    '''
+    weekdays = _weekday_numbers(dates)
+    if numpy is not None:
+        return weekdays < 5
+    return [weekday < 5 for weekday in weekdays]
+
+
+def is_weekend_many(dates):
+    '''
+    Returns for each date if it is in a weekend, like is_weekend, see
+    is_weekday_many.
+    '''
+    weekdays = _weekday_numbers(dates)
+    if numpy is not None:
+        return weekdays >= 5
+    return [weekday >= 5 for weekday in weekdays]
+
+
+def previous_weekday_many(dates):
+    '''
+    Returns for each date the last weekday before it, like previous_weekday.
+
+    Args:
+        dates (sequence) of datetime.date objects, a CompactDateList or a
+            numpy datetime64 array
+    Returns:
+        (list) of datetime.date objects, or a numpy datetime64[D] array if 
+            dates is a numpy array
+    Raises:
+        -
+    '''
+    return _shift_weekdays(dates, _PREVIOUS_WEEKDAY_DAYS, -1)
+
+
+def next_weekday_many(dates):
+    '''
+    Returns for each date the first weekday after it, like next_weekday, see
+    previous_weekday_many.
+    '''
+    return _shift_weekdays(dates, _NEXT_WEEKDAY_DAYS, 1)
+
+
+
+def _weekday_numbers(dates):
+    '''
+    Returns the weekdays (0 is Monday) of dates as a numpy array, or as a
+    list if numpy is not installed.
+    '''
+    if numpy is not None and isinstance(dates, numpy.ndarray):
+        # day 0 of datetime64 is 1-1-1970, a Thursday
+        days = dates.astype('datetime64[D]').astype(numpy.int64)
+        return (days + 3) % 7
+    # ordinal 1 is 1-1-1, a Monday
+    if isinstance(dates, CompactDateList):
+        if numpy is not None:
+            return (dates._ordinal_array() + 6) % 7
+        return [(ordinal + 6) % 7 for ordinal in dates._ordinals]
+    if numpy is not None:
+        ordinals = numpy.fromiter((date.toordinal() for date in dates),
+                dtype=numpy.int64, count=len(dates))
+        return (ordinals + 6) % 7
+    return [(date.toordinal() + 6) % 7 for date in dates]
+
+
+def _shift_weekdays(dates, days_by_weekday, direction):
+    '''
+    Returns dates, each moved by the number of days for its weekday in
+    <days_by_weekday> in <direction> (1 or -1).
+    '''
+    weekdays = _weekday_numbers(dates)
+    if numpy is not None and isinstance(dates, numpy.ndarray):
+        days = numpy.array(days_by_weekday)[weekdays] * direction
+        return dates.astype('datetime64[D]') + days.astype('timedelta64[D]')
+    deltas = [datetime.timedelta(days=days * direction) 
+            for days in days_by_weekday]
+    return [date + deltas[weekday] for date, weekday in zip(dates, weekdays)]
+
+
+def last_year(date_):
+    '''
+    Returns the same date 1 year ago.
+
+    Args:
+        date (datetime or datetime.date)
+    Returns:
+        (datetime or datetime.date)
+    Raises:
+        -
+    '''
+    day = 28 if date_.day == 29 and date_.month == 2 else date_.day
+    return datetime.date(date_.year-1, date_.month, day)
+
+
+# the header of the files written by save: magic, version and the number of
+# dates, followed by the ordinals as little endian 4 byte integers
+_SNAPSHOT_HEADER = struct.Struct('<8sII')
+_SNAPSHOT_MAGIC = b'DATELIST'
+_SNAPSHOT_VERSION = 1
+_INT32 = struct.Struct('<i')
+
+PERIODS = ('week', 'month', 'quarter', 'year')
+# the functions that return the same value for dates in the same period,
+# weeks start on Monday (ordinal 1 is a Monday)
+_PERIOD_KEYS = {
+    'week': lambda date: (date.toordinal() - 1) // 7,
+    'month': lambda date: (date.year, date.month),
+    'quarter': lambda date: (date.year, (date.month - 1) // 3),
+    'year': lambda date: date.year,
+    }
+
+
+class _DateListMethods(object):
+    '''
+    The methods of DateList and CompactDateList that only need the index
+    method and access to the dates by index.
+
+    The period methods (first_of_period, last_of_period, period_subset,
+    periods) use the boundaries of the periods in the list, which are
+    computed once per period type (O(n)) and cached, so that a lookup is
+    O(1). The cache is cleared when a DateList is changed.
+    '''
 
 #    def latest_date_before(self, date):
     def on_or_before(self, date):
@@ -293,8 +831,8 @@ class DateList(list):
 
     def subset(self, fromdate, todate):
         '''
-        Return a list of dates from the list between <fromdate> and <todate>
-        (inclusive)
+        Return a DateListView of the dates from the list between <fromdate>
+        and <todate> (inclusive), the dates are not copied.
         '''
 #CONSIDER: raise an exception if a date is not in self
         i_from = self.index(fromdate)
@@ -302,7 +840,664 @@ class DateList(list):
             # don't go back before fromdate
             i_from += 1
         i_to = self.index(todate)
-        return self[i_from:i_to + 1]
+        return DateListView(self, i_from, i_to + 1)
+
+    def index_many(self, dates):
+        '''
+        Returns the index of each date in <dates>, like index does. With numpy
+        the indexes are found with a vectorized searchsorted and returned as
+        an array, otherwise a list is returned.
+        '''
+        if numpy is not None:
+            ordinals = self._ordinal_array()
+            queries = numpy.fromiter((date.toordinal() for date in dates),
+                    dtype=numpy.int64)
+            indexes = numpy.searchsorted(ordinals, queries, 'left')
+            last = len(ordinals) - 1
+            if last >= 0:
+                # step back to the first copy of the latest date before a
+                # date that is not in the list, like index
+                found = ordinals[numpy.minimum(indexes, last)]
+                previous = numpy.searchsorted(ordinals, 
+                        ordinals[numpy.maximum(indexes - 1, 0)], 'left')
+                indexes = numpy.where(indexes > last, last, numpy.where(
+                        found != queries, previous, indexes))
+            return numpy.maximum(indexes, 0)
+        keys, queries, lo, hi = self._search_keys(dates)
+        # the searches run in C, which is faster than a sweep in Python
+        lefts = map(functools.partial(bisect.bisect_left, keys, lo=lo, hi=hi),
+                queries)
+        last = hi - 1
+        indexes = []
+        for index, query in zip(lefts, queries):
+            if index > last:
+                index = max(last, lo)
+            elif index > lo and keys[index] != query:
+                # step back like index
+                index = bisect.bisect_left(keys, keys[index - 1], lo, index)
+            indexes.append(index - lo)
+        return indexes
+
+    def offset_many(self, dates, n_days):
+        '''
+        Returns a list with offset(date, n_days) for each date in <dates>.
+        '''
+        indexes = self.index_many(dates)
+        last = len(self) - 1
+        if numpy is not None:
+            indexes = numpy.minimum(numpy.maximum(indexes + n_days, 0), last)
+            return [self[index] for index in indexes.tolist()]
+        return [self[min(max(index + n_days, 0), last)] for index in indexes]
+
+    def delta_many(self, fromdates, todates):
+        '''
+        Returns delta(fromdate, todate) for each pair of dates in <fromdates>
+        and <todates>, as an array if numpy is installed, otherwise as a list.
+
+        Raises:
+            ValueError if fromdates and todates do not have the same length
+        '''
+        fromdates = list(fromdates)
+        todates = list(todates)
+        if len(fromdates) != len(todates):
+            raise ValueError('fromdates and todates must have the same '
+                    'length')
+        indexes = self.index_many(fromdates + todates)
+        n_dates = len(fromdates)
+        if numpy is not None:
+            return indexes[n_dates:] - indexes[:n_dates]
+        return [i_to - i_from
+                for i_from, i_to in zip(indexes[:n_dates], indexes[n_dates:])]
+
+    def windows(self, size, step=1, indexes=False):
+        '''
+        Returns a generator with the windows of <size> consecutive dates in
+        the list, starting every <step> dates, as DateListViews, or as
+        (start, stop) tuples if indexes is True. Only complete windows are
+        generated.
+
+        Raises:
+            ValueError if size or step is less than 1
+        '''
+        if size < 1 or step < 1:
+            raise ValueError('size and step must be at least 1')
+        return self._windows(size, step, indexes)
+
+    def _windows(self, size, step, indexes):
+        for start in range(0, len(self) - size + 1, step):
+            if indexes:
+                yield start, start + size
+            else:
+                yield DateListView(self, start, start + size)
+
+    def windows_by_calendar(self, span, indexes=False):
+        '''
+        Returns a generator with a window for each date in the list, with the
+        dates from the list that are in the <span> (datetime.timedelta) of
+        calendar days up to and including that date, i.e.
+            date - span < window dates <= date
+        The windows are DateListViews, or (start, stop) tuples if indexes is
+        True. The windows are found in one pass through the list.
+
+        Raises:
+            ValueError if span is not positive
+        '''
+        if span <= datetime.timedelta(0):
+            raise ValueError('span must be positive')
+        return self._windows_by_calendar(span, indexes)
+
+    def _windows_by_calendar(self, span, indexes):
+        start = 0
+        for stop, date in enumerate(self, 1):
+            first = date - span
+            while self[start] <= first:
+                start += 1
+            if indexes:
+                yield start, stop
+            else:
+                yield DateListView(self, start, stop)
+
+    def _search_keys(self, dates):
+        '''
+        Returns (keys, queries, lo, hi), where keys[lo:hi] are the sorted
+        ordinals of the list (cached) and queries the ordinals of <dates>.
+        Comparing integers is faster than comparing dates.
+        '''
+        cache = self.__dict__.setdefault('_cache', {})
+        try:
+            ordinals = cache['ordinal_list']
+        except KeyError:
+            ordinals = cache['ordinal_list'] = [date.toordinal()
+                    for date in self]
+        return ordinals, [date.toordinal() for date in dates], 0, len(self)
+
+    def _ordinal_array(self):
+        '''
+        Returns a (cached) numpy array with the ordinals of the dates.
+        '''
+        cache = self.__dict__.setdefault('_cache', {})
+        try:
+            return cache['ordinal_array']
+        except KeyError:
+            ordinals = cache['ordinal_array'] = numpy.fromiter(
+                    (date.toordinal() for date in self), dtype=numpy.int64,
+                    count=len(self))
+            return ordinals
+
+    def save(self, path):
+        '''
+        Writes the dates to the file <path> as a header followed by the
+        ordinals as little endian 4 byte integers. The file can be loaded
+        with CompactDateList.load.
+        '''
+        ordinals = array.array('i', (date.toordinal() for date in self))
+        if sys.byteorder == 'big':
+            ordinals.byteswap()
+        with open(path, 'wb') as file_:
+            file_.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC,
+                    _SNAPSHOT_VERSION, len(ordinals)))
+            ordinals.tofile(file_)
+
+    def same_date_last_year(self, date):
+        '''
+        Returns the latest date from the list that is <= the same date 1 year
+        before <date>.
+        '''
+        return self.on_or_before(last_year(date))
+
+    def first_of_period(self, date, period):
+        '''
+        Returns the first date from the list in the same <period> ('week',
+        'month', 'quarter' or 'year') as <date>, or None if there are no
+        dates in that period.
+        '''
+        bounds = self._period_bounds(date, period)
+        return None if bounds is None else self[bounds[0]]
+
+    def last_of_period(self, date, period):
+        '''
+        Returns the last date from the list in the same <period> as <date>,
+        or None if there are no dates in that period.
+        '''
+        bounds = self._period_bounds(date, period)
+        return None if bounds is None else self[bounds[1] - 1]
+
+    def period_subset(self, date, period):
+        '''
+        Returns a DateListView of the dates from the list in the same
+        <period> as <date>, like subset does.
+        '''
+        bounds = self._period_bounds(date, period)
+        return DateListView(self, *(bounds or (0, 0)))
+
+    def periods(self, period):
+        '''
+        Returns a list with a (first date, last date) tuple for each <period>
+        that has dates in the list, in order.
+        '''
+        starts = self._period_index(period)[1]
+        return [(self[start], self[stop - 1])
+                for start, stop in zip(starts, starts[1:])]
+
+    def _period_bounds(self, date, period):
+        '''
+        Returns (start, stop) for the indexes of the dates in the same
+        <period> as <date>, or None if there are none.
+        '''
+        numbers, starts = self._period_index(period)
+        number = numbers.get(_PERIOD_KEYS[period](date))
+        if number is None:
+            return None
+        return starts[number], starts[number + 1]
+
+    def _period_index(self, period):
+        '''
+        Returns (numbers, starts) for <period>, where numbers is a dict with
+        the number of each period in the list by period key, and starts a
+        list with the index of the first date of each period, followed by
+        len(self).
+        '''
+        cache = self.__dict__.setdefault('_cache', {})
+        try:
+            return cache[period]
+        except KeyError:
+            if period not in _PERIOD_KEYS:
+                raise ValueError('period must be one of {}'.format(PERIODS))
+        period_key = _PERIOD_KEYS[period]
+        numbers = {}
+        starts = []
+        previous = None
+        for index, date in enumerate(self):
+            key = period_key(date)
+            if key != previous:
+                numbers[key] = len(starts)
+                starts.append(index)
+                previous = key
+        starts.append(len(self))
+        cache[period] = numbers, starts
+        return numbers, starts
+
+    def _clear_cache(self):
+        '''
+        Clears the cached period boundaries and ordinals, must be called when
+        the dates are changed.
+        '''
+        self.__dict__.pop('_cache', None)
+
+
+class DateList(_DateListMethods, list):
+    '''
+    Provides a sorted list of dates with methods to extract information.
+    The list stays sorted when it is changed: append, insert and extend add
+    the dates at their sorted position, setting items re-sorts the list and
+    reverse raises a TypeError. If unique is True, dates that are already in
+    the list are not added again.
+    '''
+
+    ONE_DAY = datetime.timedelta(days=1)
+    # pickle adds the items with extend before it restores the attributes
+    unique = False
+
+    def __init__(self, dates=(), sort=True, unique=False):
+        '''
+        Constructor stores a sorted copy of the dates, the input is not
+        changed. You can avoid sorting overhead if you are 100% sure the dates
+        are sorted by specifying sort=False. If unique is True, duplicate
+        dates are removed.
+        '''
+        self.unique = unique
+        if sort:
+            dates = sorted(dates)
+        if unique:
+            dates = _unique(dates)
+        list.__init__(self, dates)
+
+    def append(self, date):
+        '''
+        Inserts <date> at its sorted position, after equal dates. Finding the
+        position is O(log n).
+        '''
+        index = bisect.bisect_right(self, date)
+        if not (self.unique and index and self[index - 1] == date):
+            list.insert(self, index, date)
+            self._clear_cache()
+
+    def insert(self, index, date):
+        '''
+        Inserts <date> at its sorted position, like append. <index> is
+        ignored.
+        '''
+        self.append(date)
+
+    def extend(self, dates):
+        '''
+        Adds <dates> at their sorted positions. The new dates are sorted and
+        merged with the list in one sort, which is O(n) for 2 sorted runs.
+        '''
+        list.extend(self, sorted(dates))
+        self._sort()
+
+    def __iadd__(self, dates):
+        self.extend(dates)
+        return self
+
+    def __imul__(self, n):
+        list.__imul__(self, n)
+        self._sort()
+        return self
+
+    def __setitem__(self, index, value):
+        list.__setitem__(self, index, value)
+        self._sort()
+
+    def __setslice__(self, i, j, dates):
+        # Python 2 only
+        list.__setslice__(self, i, j, dates)
+        self._sort()
+
+    def sort(self, *args, **kwargs):
+        '''
+        Sorts the list by date (e.g. after it was created with sort=False).
+        Arguments (cmp, key, reverse) are not allowed.
+        '''
+        if args or kwargs:
+            raise TypeError('a DateList is always sorted by date')
+        self._sort()
+
+    def reverse(self):
+        '''
+        Raises TypeError, the list must stay sorted.
+        '''
+        raise TypeError('a DateList is always sorted by date')
+
+    def _sort(self):
+        '''
+        Restores the order (and uniqueness) after the list was changed.
+        '''
+        list.sort(self)
+        if self.unique:
+            list.__setitem__(self, slice(None), _unique(self))
+        self._clear_cache()
+
+    def index(self, date):
+        '''
+        Overloads the default list.index, because of special behaviour if the
+        date is not in the list:
+            - If <date> is not in the list, the index of the latest date before
+                <date> is returned.
+            - If <date> is earlier than the earliest date in the list, the 
+                return value is 0
+            - If <date> is later than the latest date in self.dates the return
+                value is the index of the most recent date.
+        The list is sorted, so a binary search is used: O(log n).
+        '''
+        index = bisect.bisect_left(self, date)
+        if index == len(self):
+            return max(index - 1, 0)
+        if self[index] != date and index:
+            # not in the list: step back to the (first) latest date before
+            # <date>
+            index = bisect.bisect_left(self, self[index - 1], 0, index)
+        return index
+
+    def _bisect_left(self, date, lo, hi):
+        return bisect.bisect_left(self, date, lo, hi)
+
+
+class CompactDateList(_DateListMethods):
+    '''
+    A read-only DateList that stores the dates as the integers from
+    date.toordinal() in an array, instead of as a list of datetime.date
+    objects. The date objects are only created when they are accessed.
+    It has the same methods as DateList (index, on_or_before, delta, offset,
+    subset), but it is not a list.
+
+    Memory use per date:
+        DateList: 40 bytes (a 32 byte datetime.date object and an 8 byte
+            pointer to it in the list, on a 64 bit platform)
+        CompactDateList: 4 bytes
+    '''
+
+    def __init__(self, dates, sort=True):
+        '''
+        Constructor stores the ordinals of the dates. The dates will be
+        sorted by default, you can avoid sorting overhead if you are 100% sure
+        the dates are sorted by specifying sort=False.
+        '''
+        ordinals = (date.toordinal() for date in dates)
+        if sort:
+            ordinals = sorted(ordinals)
+        self._ordinals = array.array('i', ordinals)
+
+    @classmethod
+    def from_ordinals(cls, ordinals):
+        '''
+        Returns a CompactDateList for a sorted array('i') with ordinals, the
+        array is not copied.
+        '''
+        datelist = cls.__new__(cls)
+        datelist._ordinals = ordinals
+        return datelist
+
+    def __len__(self):
+        return len(self._ordinals)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.from_ordinals(self._ordinals[index])
+        return datetime.date.fromordinal(self._ordinals[index])
+
+    def __iter__(self):
+        fromordinal = datetime.date.fromordinal
+        return (fromordinal(ordinal) for ordinal in self._ordinals)
+
+    def __contains__(self, date):
+        return self[self.index(date)] == date if self._ordinals else False
+
+    def __eq__(self, other):
+        if isinstance(other, CompactDateList):
+            return self._ordinals == other._ordinals
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, list(self))
+
+    def index(self, date):
+        '''
+        Returns the index of <date> like DateList.index does, i.e. if <date>
+        is not in the list, the index of the latest date before <date>, and 0
+        if <date> is before the first date.
+        '''
+        ordinal = date.toordinal()
+        ordinals = self._ordinals
+        index = bisect.bisect_left(ordinals, ordinal)
+        if index == len(ordinals):
+            return max(index - 1, 0)
+        if ordinals[index] != ordinal and index:
+            index = bisect.bisect_left(ordinals, ordinals[index - 1], 0, index)
+        return index
+
+    def _bisect_left(self, date, lo, hi):
+        return bisect.bisect_left(self._ordinals, date.toordinal(), lo, hi)
+
+    def _search_keys(self, dates):
+        return (self._ordinals, [date.toordinal() for date in dates], 0,
+                len(self._ordinals))
+
+    def _ordinal_array(self):
+        if isinstance(self._ordinals, _MappedOrdinals):
+            return self._ordinals.to_array()
+        return numpy.frombuffer(self._ordinals, dtype=numpy.int32)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Returns a CompactDateList with the dates in the file <path>, written
+        by save. The file is memory mapped, so loading is fast and processes
+        that load the same file share its memory (the page cache).
+
+        Raises:
+            ValueError if the file is not a file written by save
+        '''
+        with open(path, 'rb') as file_:
+            buffer_ = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(buffer_) < _SNAPSHOT_HEADER.size:
+            raise ValueError('{} is not a DateList file'.format(path))
+        magic, version, count = _SNAPSHOT_HEADER.unpack_from(buffer_)
+        if magic != _SNAPSHOT_MAGIC or version != _SNAPSHOT_VERSION or \
+                len(buffer_) != _SNAPSHOT_HEADER.size + 4 * count:
+            raise ValueError('{} is not a DateList file'.format(path))
+        return cls.from_ordinals(_MappedOrdinals(buffer_,
+                _SNAPSHOT_HEADER.size, count))
+
+    def to_datelist(self):
+        '''
+        Returns a DateList with the same dates.
+        '''
+        return DateList(list(self), sort=False)
+
+
+class _MappedOrdinals(object):
+    '''
+    A read-only sequence of the little endian 4 byte integers in a buffer
+    (an mmap), starting at <offset>. CompactDateList uses it instead of an
+    array for the ordinals of a loaded file.
+    '''
+
+    # the number of ordinals that __iter__ unpacks at once
+    CHUNK_SIZE = 4096
+
+    def __init__(self, buffer_, offset, count):
+        self._buffer = buffer_
+        self._offset = offset
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            if step == 1:
+                return _MappedOrdinals(self._buffer, self._offset + 4 * start,
+                        max(stop - start, 0))
+            return array.array('i',
+                    (self[i] for i in range(start, stop, step)))
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('index out of range')
+        return _INT32.unpack_from(self._buffer, self._offset + 4 * index)[0]
+
+    def __iter__(self):
+        for start in range(0, self._count, self.CHUNK_SIZE):
+            count = min(self.CHUNK_SIZE, self._count - start)
+            for ordinal in struct.unpack_from('<{}i'.format(count),
+                    self._buffer, self._offset + 4 * start):
+                yield ordinal
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(a == b
+                    for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def to_array(self):
+        '''
+        Returns a numpy array that uses the buffer, it is not copied.
+        '''
+        return numpy.frombuffer(self._buffer, dtype='<i4', count=self._count,
+                offset=self._offset)
+
+
+class DateListView(_DateListMethods):
+    '''
+    A read-only view of the dates start:stop of a DateList or
+    CompactDateList, as returned by subset. The dates are not copied: the view
+    only stores its parent and the start and stop indexes. It has the same
+    methods as DateList (the indexes are relative to the view), slicing it
+    returns a view as well, and materialize returns a copy.
+    A view is not valid anymore after its parent DateList is changed.
+    '''
+
+    def __init__(self, parent, start, stop):
+        if isinstance(parent, DateListView):
+            # a view of a view is a view of the original parent
+            start += parent._start
+            stop += parent._start
+            parent = parent._parent
+        self._parent = parent
+        self._start = min(max(start, 0), len(parent))
+        self._stop = min(max(stop, self._start), len(parent))
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return DateListView(self, start, stop)
+            return [self[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('DateListView index out of range')
+        return self._parent[self._start + index]
+
+    def __iter__(self):
+        # by index, a slice of the parent would copy the dates
+        parent = self._parent
+        return (parent[i] for i in 
+                itertools.islice(itertools.count(self._start), len(self)))
+
+    def __contains__(self, date):
+        return self[self.index(date)] == date if len(self) else False
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, list(self))
+
+    def index(self, date):
+        '''
+        Returns the index of <date> in the view like DateList.index does.
+        '''
+        start, stop = self._start, self._stop
+        parent = self._parent
+        index = parent._bisect_left(date, start, stop)
+        if index == stop:
+            return max(index - 1 - start, 0)
+        if parent[index] != date and index > start:
+            index = parent._bisect_left(parent[index - 1], start, index)
+        return index - start
+
+    def materialize(self):
+        '''
+        Returns a copy of the dates in the view, as a DateList or a
+        CompactDateList like the parent.
+        '''
+        dates = self._parent[self._start:self._stop]
+        if isinstance(self._parent, DateList):
+            return DateList(dates, sort=False)
+        return dates
+
+    def _search_keys(self, dates):
+        # the parent is never a view, so its keys start at 0
+        keys, queries, unused, unused = self._parent._search_keys(dates)
+        return keys, queries, self._start, self._stop
+
+    def _ordinal_array(self):
+        return self._parent._ordinal_array()[self._start:self._stop]
+
+
+def _unique(dates):
+    '''
+    Returns a list with the sorted <dates> without duplicates.
+    '''
+    return [date for date, unused in itertools.groupby(dates)]
+
+
+def _clearing_cache(name):
+    '''
+    Returns list method <name> for DateList, that clears the cache after
+    changing the list.
+    '''
+    method = getattr(list, name)
+
+    def mutator(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._clear_cache()
+        return result
+    mutator.__name__ = name
+    mutator.__doc__ = method.__doc__
+    return mutator
+
+# the methods that can't break the order, __delslice__ only exists in Python 2
+for _name in ('remove', 'pop', '__delitem__', '__delslice__'):
+    if hasattr(list, _name):
+        setattr(DateList, _name, _clearing_cache(_name))
+del _name
 
 
 VALID_TIME_FORMATS_TEXT = '''The following time formats are valid:
@@ -363,6 +1558,20 @@ def time2timestr(time, fmt='hhmmss'):
         fmt (str) a format string.
     Returns:
         (str) that represents a time.
+    Raises:
+        ValueError if the format is not valid.
+    '''
+    formatter = _time_formatters.get(fmt)
+    if formatter is None:
+        formatter = _time_formatters[fmt] = TimeFormatter(fmt)
+    return formatter.format(time)
+
+
+def _split_time_format(fmt):
+    '''
+    Validates a time format string and returns the hour, minutes and seconds
+    parts, where seconds is None if the format has no seconds.
+
     Raises:
         ValueError if the format is not valid.
     '''
@@ -389,19 +1598,158 @@ def time2timestr(time, fmt='hhmmss'):
         if string is not None and any(c != char for c in string):
             raise ValueError('Invalid date format: {} is not {}'.\
                     format(char, string))
-    if len(h) == 2:
-        fmt = fmt.replace('hh', '%H', 1)
-    elif len(h) == 1:
-        fmt = fmt.replace('h', 'X%H', 1)
-    else:
+    if not 1 <= len(h) <= 2:
         raise ValueError('Invalid format string, hour must have 1 or 2 digits')
-    if len(m) == 2:
-        fmt = fmt.replace('mm', '%M', 1)
-    else:
+    if len(m) != 2:
         raise ValueError('Invalid format string, minutes must have 2 digits')
-    if s is not None and len(s) == 2:
-        fmt = fmt. replace('ss', '%S', 1)
-    elif s is not None:
+    if s is not None and len(s) != 2:
         raise ValueError('Invalid format string, seconds must have 2 digits')
-    return time.strftime(fmt).replace('X0','X').replace('X','')
+    return h, m, s
+
+
+class TimeFormatter(object):
+    '''
+    Turns datetime.time objects into strings with one format. The format
+    is validated once, so use this instead of time2timestr to format many
+    times.
+    '''
+
+    def __init__(self, fmt='hhmmss'):
+        '''
+        Constructor validates the format string, which must have one of the
+        formats from VALID_TIME_FORMATS_TEXT.
+
+        Raises:
+            ValueError if the format is not valid.
+        '''
+        h, m, s = _split_time_format(fmt)
+        self.fmt = fmt
+        hour = '%02d' if len(h) == 2 else '%d'
+        separator = ':' if ':' in fmt else ''
+        if s is None:
+            self._pattern = separator.join((hour, '%02d'))
+            self._values = lambda time: (time.hour, time.minute)
+        else:
+            self._pattern = separator.join((hour, '%02d', '%02d'))
+            self._values = lambda time: (time.hour, time.minute, time.second)
+
+    def format(self, time):
+        '''
+        Returns the string that represents <time>.
+        '''
+        return self._pattern % self._values(time)
+
+    def format_many(self, times):
+        '''
+        Returns a list with the strings that represent <times>.
+        '''
+        pattern = self._pattern
+        values = self._values
+        return [pattern % values(time) for time in times]
+
+
+# TimeFormatter objects by format, used by time2timestr
+_time_formatters = {}
+
+
+class TimeParser(object):
+    '''
+    Turns strings with one format into datetime.time objects. Use this
+    instead of timestr2time to parse many strings. A string that does not
+    have the format of the parser is parsed (or rejected) by timestr2time, so
+    the results are always the same.
+    '''
+
+    def __init__(self, fmt='hhmmss'):
+        '''
+        Constructor validates the format string, which must have one of the
+        formats from VALID_TIME_FORMATS_TEXT.
+
+        Raises:
+            ValueError if the format is not valid.
+        '''
+        h, m, s = _split_time_format(fmt)
+        self.fmt = fmt
+        if ':' not in fmt:
+            self._parse = _parse_hhmmss
+        elif s is None:
+            self._parse = _parse_hh_mm
+        else:
+            self._parse = _parse_hh_mm_ss
+
+    def parse(self, time_str):
+        '''
+        Returns the datetime.time that <time_str> represents.
+
+        Raises:
+            ValueError if the string does not have a valid format.
+        '''
+        time = self._parse(time_str)
+        if time is None:
+            # not "or": midnight is False in Python 2
+            time = timestr2time(time_str)
+        return time
 
+    def parse_many(self, time_strs):
+        '''
+        Returns a list with the datetime.time objects that <time_strs>
+        represent.
+
+        Raises:
+            ValueError if a string does not have a valid format.
+        '''
+        parse = self._parse
+        times = []
+        for time_str in time_strs:
+            time = parse(time_str)
+            if time is None:
+                time = timestr2time(time_str)
+            times.append(time)
+        return times
+
+
+def _parse_hhmmss(time_str):
+    '''
+    Parser for the hhmmss format, returns None if time_str has another format.
+    '''
+    # only ascii digits, like timestr2time
+    if len(time_str) == 6 and not time_str.strip(string.digits):
+        try:
+            return datetime.time(int(time_str[:2]), int(time_str[2:4]),
+                    int(time_str[4:]))
+        except ValueError:
+            pass
+
+
+def _parse_hh_mm_ss(time_str):
+    '''
+    Parser for the hh:mm:ss and h:mm:ss formats, returns None if time_str has
+    another format.
+    '''
+    parts = time_str.split(':')
+    if len(parts) == 3:
+        return _make_time(*parts)
+
+
+def _parse_hh_mm(time_str):
+    '''
+    Parser for the hh:mm and h:mm formats, returns None if time_str has
+    another format.
+    '''
+    parts = time_str.split(':')
+    if len(parts) == 2:
+        return _make_time(parts[0], parts[1], '00')
+
+
+def _make_time(h, m, s):
+    '''
+    Returns the time for the hour, minutes and seconds strings, or None if
+    they are not valid.
+    '''
+    # only ascii digits, like timestr2time
+    if 1 <= len(h) <= 2 and len(m) == 2 and len(s) == 2 and \
+            not (h + m + s).strip(string.digits):
+        try:
+            return datetime.time(int(h), int(m), int(s))
+        except ValueError:
+            pass
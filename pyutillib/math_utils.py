@@ -20,8 +20,16 @@ along with this program.  If not, see `<http://www.gnu.org/licenses/>`.
 from __future__ import division
 from __future__ import absolute_import
 
+import functools
 import operator
-from pyutillib.string_utils import str2tuple
+from bisect import bisect_left, bisect_right
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyutillib.string_utils import LRUCache, str2tuple
 
 
 def div(numerator, denominator):
@@ -51,6 +59,87 @@ def div(numerator, denominator):
             return numerator/denominator
 
 
+# the results of x / 0 (x != 0) that div_many can give
+DIV_POLICIES = ('inf', 'nan', 'none', 'raise')
+_X_DIV_0 = {'inf': float('inf'), 'nan': float('nan'), 'none': None}
+
+
+def div_many(numerators, denominators, policy='inf'):
+    '''
+    Returns numerator / denominator for each pair of numerators and
+    denominators, with the same rules as div:
+        0 / 0 = 0.
+        x / 0 = float('inf')
+    unless another result of x / 0 is specified by <policy>. With numpy
+    installed the division is done with array operations, otherwise in a
+    list comprehension without exception handling.
+
+    Args:
+        numerators (list or numpy array) of floats or ints
+        denominators (list or numpy array) of floats or ints, with the same
+            length as numerators
+        policy (str) the result of x / 0:
+            'inf': float('inf'), like div
+            'nan': float('nan')
+            'none': None
+            'raise': raise a ZeroDivisionError
+    Returns:
+        (numpy.ndarray) of floats, or of objects if policy is 'none', or
+        (list) if numpy is not installed
+    Raises:
+        ValueError if policy is not valid, or if numerators and denominators
+            do not have the same length
+        ZeroDivisionError if policy is 'raise' and there is an x / 0
+    '''
+    if policy not in DIV_POLICIES:
+        raise ValueError('policy must be one of {}'.format(DIV_POLICIES))
+    if len(numerators) != len(denominators):
+        raise ValueError('numerators and denominators must have the same '
+                'length')
+    if numpy is not None:
+        return _div_arrays(numpy.asarray(numerators, dtype=float),
+                numpy.asarray(denominators, dtype=float), policy)
+    if policy == 'raise' and any(d == 0 and n != 0 for n, d in 
+            zip(numerators, denominators)):
+        raise ZeroDivisionError('division by zero')
+    x_div_0 = _X_DIV_0.get(policy)
+    return [n / d if d != 0 else (0. if n == 0 else x_div_0)
+            for n, d in zip(numerators, denominators)]
+
+
+def _div_arrays(numerators, denominators, policy='inf'):
+    '''
+    The numpy version of div_many, where numerators and denominators are
+    float arrays (or scalars) that can be broadcast together.
+    '''
+    zero = denominators == 0
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        quotients = numerators / denominators
+    if not zero.any():
+        return quotients
+    x_div_0 = zero & (numerators != 0)
+    if policy == 'raise' and x_div_0.any():
+        raise ZeroDivisionError('division by zero')
+    quotients = numpy.where(zero, 0., quotients)
+    if not x_div_0.any():
+        return quotients
+    return numpy.where(x_div_0, _X_DIV_0[policy], quotients)
+
+
+COMPARISON_OPERATORS = ('lt', 'le', 'eq', 'ne', 'ge', 'gt')
+BOOLEAN_OPERATORS = ('and', 'or')
+ARITHMETIC_OPERATORS = ('add', 'sub', 'mul', 'truediv')
+MEMBERSHIP_OPERATORS = ('in', 'not in')
+OPERATORS = COMPARISON_OPERATORS + BOOLEAN_OPERATORS + ARITHMETIC_OPERATORS + \
+        MEMBERSHIP_OPERATORS
+
+COMPILED_CONDITIONS_CACHE_SIZE = 256
+# the compiled conditions by _conditions_key, and by id for conditions that
+# are used again, the entries keep the conditions, so the id is not reused
+_compiled_conditions = LRUCache(COMPILED_CONDITIONS_CACHE_SIZE)
+_compiled_by_id = LRUCache(COMPILED_CONDITIONS_CACHE_SIZE)
+
+
 def eval_conditions(conditions=None, data={}):
     '''
     Evaluates conditions and returns Boolean value.
@@ -68,47 +157,718 @@ def eval_conditions(conditions=None, data={}):
                     e.g. ('abc', 'eq', 3)
                 if a boolean operator does not get boolean arguments
                     e.g. (True, 'and', 15)
+                if an arithmetic operator does not get numerical arguments
+                    e.g. ('abc', 'add', 1)
 
     The format of the condition tuple is:
         (arg1, op, arg2)
     where:
         arg1, arg2 can be numerical values, strings or condition tuples
-        op is a valid operator from the operator module
+        op is one of:
+            COMPARISON_OPERATORS: 'lt', 'le', 'eq', 'ne', 'ge', 'gt'
+            BOOLEAN_OPERATORS: 'and', 'or'
+            ARITHMETIC_OPERATORS: 'add', 'sub', 'mul', 'truediv', where
+                truediv uses div, so x / 0 does not raise an exception
+            MEMBERSHIP_OPERATORS: 'in', 'not in', where arg2 is a tuple, list
+                or set (that is never treated as a condition tuple), or a
+                string
     If arg is a string, and the string is a key in <data> it is treated as
     a variable with value data[arg].
 
     Notes:
         * If no conditions are specified True is returned.
         * empty or 0 values do *not* evaluate to booleans
+        * 'and' and 'or' stop at the first argument that decides the result,
+            e.g. (False, 'and', 15) is False. Chains like
+            (a, 'and', (b, 'and', c)) are evaluated as one n-ary 'and'.
+        * The compiled conditions are cached, see compile_conditions.
+    '''
+    cached = _compiled_by_id.get(id(conditions))
+    if cached is not None and cached[0] is conditions:
+        return cached[1](data)
+    try:
+        key = _conditions_key(conditions)
+        evaluate = _compiled_conditions.get(key)
+    except TypeError:
+        # unhashable conditions, e.g. with a list argument, are not cached
+        return _compile_unchecked(conditions)(data)
+    if evaluate is None:
+        evaluate = _compile_unchecked(conditions)
+        _compiled_conditions[key] = evaluate
+    _compiled_by_id[id(conditions)] = (conditions, evaluate)
+    return evaluate(data)
+
+
+def compile_conditions(conditions=None):
+    '''
+    Validates conditions once and returns a function that evaluates them.
+    Use this instead of eval_conditions to evaluate the same conditions for
+    many different <data> dicts.
+
+    Args:
+        conditions (tuple or str) see eval_conditions
+    Returns:
+        (function) that takes an optional <data> dict and returns the same
+            Boolean value as eval_conditions(conditions, data)
+    Raises:
+        ValueError if an invalid operator value is specified
+        TypeError if conditions are not a 3-item tuple
+        The returned function raises TypeError like eval_conditions does if
+        the arguments do not have the right type.
+    '''
+    evaluate = _compile_unchecked(conditions)
+    if isinstance(conditions, str) or isinstance(conditions, unicode):
+        conditions = str2tuple(conditions)
+    _check_operators(conditions)
+    return evaluate
+
+
+def _compile_unchecked(conditions):
+    '''
+    Returns the function of compile_conditions without checking the
+    operators first: like eval_conditions, the function raises ValueError for
+    an invalid operator only after the arguments are evaluated.
+    '''
+    return _compile(conditions, _compile_unchecked)
+
+
+def _check_operators(conditions):
+    '''
+    Raises ValueError if conditions that are known to be valid tuples contain
+    an invalid operator. A stack is used instead of recursion, so long chains
+    are no problem.
+    '''
+    stack = [conditions]
+    while stack:
+        item = stack.pop()
+        if not item:
+            continue
+        arg1, op, arg2 = item
+        if op not in OPERATORS:
+            raise ValueError('operator {} not supported', op)
+        # the second argument of 'in' and 'not in' is a container
+        if isinstance(arg2, tuple) and op not in MEMBERSHIP_OPERATORS:
+            stack.append(arg2)
+        if isinstance(arg1, tuple):
+            stack.append(arg1)
+
+
+def _compile(conditions, compile_nested):
+    '''
+    Returns the function of compile_conditions, compile_nested is the
+    function that compiles the condition tuples in the arguments.
     '''
-#CONSIDER: implementing addition/subtraction/multiplication/division
     if not conditions:
-        return True
+        return _always_true
     if isinstance(conditions, str) or isinstance(conditions, unicode):
         conditions = str2tuple(conditions)
     if not isinstance(conditions, tuple) or not len(conditions) == 3:
         raise TypeError('conditions must be a tuple with 3 items.')
-    arg1 = conditions[0]
+    arg1, op, arg2 = conditions
+    if op in BOOLEAN_OPERATORS:
+        return _compile_boolean(op, _flatten(conditions), compile_nested)
+    get_arg1 = _compile_argument(arg1, compile_nested)
+    if op in COMPARISON_OPERATORS:
+        get_arg2 = _compile_argument(arg2, compile_nested)
+        compare = getattr(operator, op)
+        def evaluate(data={}):
+            arg1 = get_arg1(data)
+            arg2 = get_arg2(data)
+            if not (type(arg1) in (float, int) and type(arg2) in (float,int))\
+                    and type(arg1) != type(arg2):
+                raise TypeError('both arguments must have the same type {}, '
+                        '{}'.format(arg1, arg2))
+            return compare(arg1, arg2)
+    elif op in ARITHMETIC_OPERATORS:
+        get_arg2 = _compile_argument(arg2, compile_nested)
+        calculate = div if op == 'truediv' else getattr(operator, op)
+        def evaluate(data={}):
+            arg1 = get_arg1(data)
+            arg2 = get_arg2(data)
+            if type(arg1) not in (float, int) or \
+                    type(arg2) not in (float, int):
+                raise TypeError('arithmetic operator {} needs numerical '
+                        'arguments {}, {}'.format(op, arg1, arg2))
+            return calculate(arg1, arg2)
+    elif op in MEMBERSHIP_OPERATORS:
+        get_arg2 = _compile_container(arg2, compile_nested)
+        contains = op == 'in'
+        def evaluate(data={}):
+            return (get_arg1(data) in get_arg2(data)) == contains
+    else:
+        get_arg2 = _compile_argument(arg2, compile_nested)
+        def evaluate(data={}):
+            # the arguments can raise TypeError first
+            get_arg1(data)
+            get_arg2(data)
+            raise ValueError('operator {} not supported', op)
+    return evaluate
+
+
+def _flatten(conditions):
+    '''
+    Returns the arguments of a chain of conditions with the same boolean
+    operator, e.g. [a, b, c, d] for ((a, 'and', b), 'and', (c, 'and', d)).
+    A stack is used instead of recursion, so long chains are no problem.
+    '''
     op = conditions[1]
-    arg2 = conditions[2]
-    if arg1 in data:
-        arg1 = data[arg1]
-    elif isinstance(arg1, tuple):
-        arg1 = eval_conditions(arg1, data)
-    if arg2 in data:
-        arg2 = data[arg2]
-    elif isinstance(arg2, tuple):
-        arg2 = eval_conditions(arg2, data)
-    if op in ('lt', 'le', 'eq', 'ne', 'ge', 'gt'):
-        if not (type(arg1) in (float, int) and type(arg2) in (float,int)) and \
-                type(arg1) != type(arg2):
+    args = []
+    stack = [conditions]
+    while stack:
+        arg = stack.pop()
+        if isinstance(arg, tuple) and len(arg) == 3 and arg[1] == op:
+            stack.append(arg[2])
+            stack.append(arg[0])
+        else:
+            args.append(arg)
+    return args
+
+
+def _compile_boolean(op, args, compile_nested):
+    '''
+    Returns a function that evaluates the arguments of an n-ary 'and' or 'or'
+    until one of them decides the result.
+    '''
+    get_args = [_compile_argument(arg, compile_nested) for arg in args]
+    # 'and' stops at the first False, 'or' at the first True
+    stop = op == 'or'
+    def evaluate(data={}):
+        for get_arg in get_args:
+            arg = get_arg(data)
+            if not isinstance(arg, bool):
+                raise TypeError('boolean operator {} needs boolean arguments '
+                        '{}'.format(op, arg))
+            if arg is stop:
+                return stop
+        return not stop
+    return evaluate
+
+
+def eval_conditions_many(conditions=None, data={}):
+    '''
+    Evaluates conditions for many records at once. With numpy installed, the
+    conditions are evaluated on whole columns with array operations.
+
+    Args:
+        conditions (tuple) see eval_conditions
+        data (dict) with for each variable a column (numpy array or list), all
+                columns must have the same length
+            or (list) of data dicts, i.e. one dict per record
+    Returns:
+        (numpy.ndarray) of booleans, or (list) if numpy is not installed
+    Raises:
+        see eval_conditions
+
+    A column that numpy can only store as an array of objects, e.g. a list
+    with values of different types, is evaluated one record at a time.
+    '''
+    # validates the string as well, str2tuple returns None if it is not a
+    # tuple
+    evaluate = _compile_unchecked(conditions)
+    if isinstance(conditions, str) or isinstance(conditions, unicode):
+        conditions = str2tuple(conditions)
+    if isinstance(data, dict):
+        if numpy is not None:
+            columns = dict((k, numpy.asarray(v)) for k, v in data.items())
+            n_records = len(next(iter(columns.values()))) if columns else 0
+            if not n_records:
+                return numpy.zeros(0, dtype=bool)
+            try:
+                mask = _eval_columns(conditions, columns)
+            except _NotVectorizable:
+                pass
+            else:
+                return mask & numpy.ones(n_records, dtype=bool)
+        keys = list(data)
+        # numpy scalars are not float, int or bool for eval_conditions, and
+        # a list is not converted, numpy would turn e.g. [1, 'a'] into strings
+        records = [dict(zip(keys, row)) for row in zip(*[data[k].tolist() 
+                if numpy is not None and isinstance(data[k], numpy.ndarray)
+                else data[k] for k in keys])]
+    else:
+        records = data
+    results = [evaluate(record) for record in records]
+    if numpy is not None:
+        return numpy.array(results, dtype=bool)
+    return results
+
+
+class _NotVectorizable(Exception):
+    '''
+    Raised if a column can not be evaluated with array operations.
+    '''
+
+
+# the argument types that can be compared by eval_conditions, by numpy kind
+_NUMBER = 'number'
+_ARRAY_TYPES = {'b': bool, 'i': _NUMBER, 'u': _NUMBER, 'f': _NUMBER, 
+        'U': type(u''), 'S': type(b'')}
+
+
+def _eval_columns(conditions, columns):
+    '''
+    Evaluates validated conditions on a dict of numpy arrays and returns a
+    boolean array, or a boolean if no column is used.
+    '''
+    if not conditions:
+        return True
+    arg1, op, arg2 = conditions
+    if op in BOOLEAN_OPERATORS:
+        return _eval_boolean_columns(op, _flatten(conditions), columns)
+    if op not in COMPARISON_OPERATORS and op not in ARITHMETIC_OPERATORS:
+        # membership is evaluated one record at a time, as is an invalid
+        # operator, which raises ValueError after the arguments
+        raise _NotVectorizable()
+    arg1 = _column_argument(arg1, columns)
+    arg2 = _column_argument(arg2, columns)
+    type1 = _argument_type(arg1)
+    type2 = _argument_type(arg2)
+    if op in COMPARISON_OPERATORS:
+        if not (type1 == _NUMBER and type2 == _NUMBER) and type1 != type2:
             raise TypeError('both arguments must have the same type {}, {}'.\
                     format(arg1, arg2))
-    elif op in ('and', 'or'):
-        if not isinstance(arg1, bool) or not isinstance(arg2, bool):
-            raise TypeError('boolean operator {} needs boolean arguments {},'\
-                    ' {}'.format(op, arg1, arg2))
-        op += '_'
-    else:
-        raise ValueError('operator {} not supported', op)
+        return getattr(operator, op)(arg1, arg2)
+    # add, sub, mul or truediv
+    if type1 != _NUMBER or type2 != _NUMBER:
+        raise TypeError('arithmetic operator {} needs numerical arguments'
+                ' {}, {}'.format(op, arg1, arg2))
+    if op == 'truediv':
+        if isinstance(arg1, numpy.ndarray) or isinstance(arg2, 
+                numpy.ndarray):
+            return _div_arrays(numpy.asarray(arg1, dtype=float), 
+                    numpy.asarray(arg2, dtype=float))
+        return div(arg1, arg2)
     return getattr(operator, op)(arg1, arg2)
+
+
+def _eval_boolean_columns(op, args, columns):
+    '''
+    Evaluates the arguments of an n-ary 'and' or 'or' on the columns and
+    combines them, see _eval_columns.
+    '''
+    try:
+        args = [_column_argument(arg, columns) for arg in args]
+    except TypeError:
+        # one record at a time, the argument that raises may not be needed
+        # for any record
+        raise _NotVectorizable()
+    if any(_argument_type(arg) != bool for arg in args):
+        # one record at a time, 'and' and 'or' may not need all arguments
+        raise _NotVectorizable()
+    return functools.reduce(operator.and_ if op == 'and' else operator.or_,
+            args)
+
+
+def _column_argument(arg, columns):
+    '''
+    Returns the column <arg>, the evaluated conditions if arg is a conditions
+    tuple or else arg itself.
+    '''
+    if isinstance(arg, tuple):
+        return _eval_columns(arg, columns)
+    elif arg in columns:
+        return columns[arg]
+    return arg
+
+
+def _argument_type(arg):
+    '''
+    Returns the type of a scalar or of the items of an array, where floats
+    and ints are the same type.
+    '''
+    if isinstance(arg, numpy.ndarray):
+        try:
+            return _ARRAY_TYPES[arg.dtype.kind]
+        except KeyError:
+            raise _NotVectorizable()
+    if type(arg) in (float, int):
+        return _NUMBER
+    return type(arg)
+
+
+def _compile_container(arg, compile_nested):
+    '''
+    Returns a function that gets the second argument of 'in' and 'not in'
+    from <data>: a tuple, list or set is used as it is, anything else like
+    other arguments.
+    '''
+    if isinstance(arg, (tuple, list, set, frozenset)):
+        return lambda data: arg
+    return _compile_argument(arg, compile_nested)
+
+
+def _conditions_key(conditions):
+    '''
+    Returns a flat tuple with the type and value of every item of the
+    conditions, e.g. (1, 'and', True) == (True, 'and', True), but only the
+    latter is valid, so they must not have the same key. Nested tuples are
+    replaced by tuple and their length, and a stack is used instead of
+    recursion, so long chains can be compared and hashed.
+    '''
+    key = []
+    stack = [conditions]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, tuple):
+            key.append(tuple)
+            key.append(len(item))
+            stack.extend(reversed(item))
+        else:
+            key.append(type(item))
+            key.append(item)
+    return tuple(key)
+
+
+def _always_true(data={}):
+    '''
+    The compiled form of empty conditions.
+    '''
+    return True
+
+
+def _compile_argument(arg, compile_nested):
+    '''
+    Returns a function that gets the value of a condition argument from
+    <data>: the evaluated conditions if arg is a conditions tuple, the value
+    of data[arg] if arg is a key in data or else arg itself.
+    '''
+    if isinstance(arg, tuple):
+        # only strings are variables
+        return compile_nested(arg)
+    else:
+        def get_argument(data):
+            return data[arg] if arg in data else arg
+    return get_argument
+
+
+class RuleSet(object):
+    '''
+    A set of rules, i.e. conditions with an id, that finds the rules that
+    are True for a <data> dict, like eval_conditions does for every rule, but
+    without evaluating most of the rules that can not be True:
+        * conditions that appear more than once, in one or more rules, are
+          evaluated only once per <data> dict.
+        * a rule that is (or is an 'and' of) a condition like
+          (variable, 'eq', 'NL') or (variable, 'lt', 10), where variable is a
+          string and the other argument a constant, is indexed by that
+          condition. Only the rules that the index finds for the value of
+          data[variable] are evaluated. Numbers are indexed for all
+          comparison operators except 'ne', strings only for 'eq'. A rule
+          without an 'eq' condition is indexed by all its range conditions,
+          e.g. both (variable, 'ge', 10) and (variable, 'lt', 20).
+    Note that a rule that is excluded by the index is not evaluated at all,
+    so it does not raise the TypeError that eval_conditions raises if e.g. a
+    number is compared with a string.
+
+    Args:
+        rules (dict or iterable of (rule_id, conditions) tuples)
+    Raises:
+        see add
+    '''
+
+    def __init__(self, rules=()):
+        self._rules = []
+        self._positions = {}
+        self._matcher = None
+        if isinstance(rules, dict):
+            rules = rules.items()
+        for rule_id, conditions in rules:
+            self.add(rule_id, conditions)
+
+    def add(self, rule_id, conditions):
+        '''
+        Adds a rule.
+
+        Args:
+            rule_id (hashable) the id that match returns if conditions are
+                True
+            conditions (tuple or str) see eval_conditions
+        Raises:
+            ValueError if there already is a rule with rule_id, or if an
+                invalid operator value is specified
+            TypeError if conditions are not a 3-item tuple
+        '''
+        if rule_id in self._positions:
+            raise ValueError('rule {} already exists'.format(rule_id))
+        # validates the string as well, str2tuple returns None if it is not
+        # a tuple
+        compile_conditions(conditions)
+        if isinstance(conditions, str) or isinstance(conditions, unicode):
+            conditions = str2tuple(conditions)
+        self._positions[rule_id] = len(self._rules)
+        self._rules.append((rule_id, conditions))
+        self._matcher = None
+
+    def remove(self, rule_id):
+        '''
+        Removes a rule.
+
+        Raises:
+            KeyError if there is no rule with rule_id
+        '''
+        del self._rules[self._positions.pop(rule_id)]
+        self._positions = dict((r[0], i) for i, r in enumerate(self._rules))
+        self._matcher = None
+
+    def __len__(self):
+        return len(self._rules)
+
+    def __contains__(self, rule_id):
+        return rule_id in self._positions
+
+    def match(self, data={}):
+        '''
+        Returns the ids of the rules that are True for <data>.
+
+        Args:
+            data (dict) see eval_conditions
+        Returns:
+            (list) of rule ids, in the order in which the rules were added
+        Raises:
+            TypeError like eval_conditions, for the rules that are evaluated
+        '''
+        if self._matcher is None:
+            self._matcher = _RuleMatcher(self._rules)
+        return self._matcher.match(data)
+
+    def match_many(self, records):
+        '''
+        Returns the ids of the matching rules for each data dict in
+        <records>, see match.
+        '''
+        return [self.match(data) for data in records]
+
+
+# the indexed comparisons with the variable as second argument, by operator
+_REVERSED_OPERATORS = {'eq': 'eq', 'lt': 'gt', 'le': 'ge', 'gt': 'lt',
+        'ge': 'le'}
+
+
+class _RuleMatcher(object):
+    '''
+    The compiled rules and the index of a RuleSet.
+    '''
+
+    def __init__(self, rules):
+        self._rule_ids = [rule_id for rule_id, _ in rules]
+        self._tick = [0]
+        counts = {}
+        for _, conditions in rules:
+            _count_conditions(conditions, counts)
+        compiled = {}
+        def compile_nested(conditions):
+            return _compile_shared(conditions, counts, compiled,
+                    compile_nested, self._tick)
+        self._evaluators = [compile_nested(conditions) if conditions else
+                _always_true for _, conditions in rules]
+        self._eq_index = {}
+        # the rules with one range condition and with more, by variable
+        self._range_index = {}
+        self._multi_range_index = {}
+        self._needed = {}
+        self._string_constants = set()
+        self._unindexed = []
+        for position, (_, conditions) in enumerate(rules):
+            leaves = _index_leaves(conditions)
+            if not leaves:
+                self._unindexed.append(position)
+            elif leaves[0][1] == 'eq':
+                variable, _, constant = leaves[0]
+                if isinstance(constant, _STRING_TYPES):
+                    self._string_constants.add(constant)
+                values = self._eq_index.setdefault(variable, {})
+                values.setdefault(constant, []).append(position)
+            else:
+                range_index = self._range_index
+                if len(leaves) > 1:
+                    range_index = self._multi_range_index
+                    self._needed[position] = len(leaves)
+                for variable, op, constant in leaves:
+                    ranges = range_index.setdefault(variable, {})
+                    ranges.setdefault(op, []).append((constant, position))
+        for range_index in (self._range_index, self._multi_range_index):
+            for ranges in range_index.values():
+                for op, items in ranges.items():
+                    items.sort()
+                    ranges[op] = ([t for t, _ in items], 
+                            [p for _, p in items])
+
+    def match(self, data):
+        '''
+        Returns the ids of the rules that are True for <data>.
+        '''
+        self._tick[0] += 1
+        if self._string_constants and \
+                not self._string_constants.isdisjoint(data):
+            # a string constant is a variable in data, so the index does not
+            # apply
+            positions = range(len(self._evaluators))
+        else:
+            positions = sorted(self._candidates(data))
+        evaluators = self._evaluators
+        return [self._rule_ids[p] for p in positions if
+                evaluators[p](data) is True]
+
+    def _candidates(self, data):
+        '''
+        Returns the set of positions of the rules that may be True for
+        <data>.
+        '''
+        candidates = set(self._unindexed)
+        for variable, values in self._eq_index.items():
+            value = data[variable] if variable in data else variable
+            try:
+                candidates.update(values.get(value, ()))
+            except TypeError:
+                # unhashable, so not equal to any constant
+                pass
+        for positions in _range_hits(self._range_index, data):
+            candidates.update(positions)
+        if self._multi_range_index:
+            # a rule is a candidate if all its range conditions are True
+            counts = {}
+            for positions in _range_hits(self._multi_range_index, data):
+                for position in positions:
+                    counts[position] = counts.get(position, 0) + 1
+            needed = self._needed
+            candidates.update(p for p, n in counts.items() if n == needed[p])
+        return candidates
+
+
+def _range_hits(range_index, data):
+    '''
+    Generates for each variable and operator in <range_index> the list of
+    positions of the rules for which the range condition is True.
+    '''
+    for variable, ranges in range_index.items():
+        value = data[variable] if variable in data else variable
+        if type(value) not in (float, int):
+            continue
+        for op, (thresholds, positions) in ranges.items():
+            if op == 'lt':
+                yield positions[bisect_right(thresholds, value):]
+            elif op == 'le':
+                yield positions[bisect_left(thresholds, value):]
+            elif op == 'gt':
+                yield positions[:bisect_left(thresholds, value)]
+            else:
+                yield positions[:bisect_right(thresholds, value)]
+
+
+_STRING_TYPES = (str, type(u''))
+
+
+def _shared_key(conditions):
+    '''
+    Returns the key of conditions in the counts of shared conditions, or None
+    if conditions are not hashable.
+    '''
+    key = _conditions_key(conditions)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _count_conditions(conditions, counts):
+    '''
+    Counts the conditions tuples that are compiled for <conditions>, in the
+    same way as compile_conditions compiles them.
+    '''
+    stack = [conditions]
+    while stack:
+        conditions = stack.pop()
+        if not isinstance(conditions, tuple) or len(conditions) != 3:
+            continue
+        key = _shared_key(conditions)
+        if key is not None:
+            counts[key] = counts.get(key, 0) + 1
+            if counts[key] > 1:
+                # the nested conditions are compiled only once
+                continue
+        arg1, op, arg2 = conditions
+        if op in BOOLEAN_OPERATORS:
+            stack.extend(_flatten(conditions))
+        elif op in MEMBERSHIP_OPERATORS:
+            stack.append(arg1)
+        else:
+            stack.extend((arg1, arg2))
+
+
+def _compile_shared(conditions, counts, compiled, compile_nested, tick):
+    '''
+    Returns the function that evaluates conditions. Conditions are compiled
+    only once, and if they appear more than once the result is cached until
+    tick changes, i.e. for the next data dict.
+    '''
+    key = _shared_key(conditions)
+    if key is None:
+        return _compile(conditions, compile_nested)
+    if key not in compiled:
+        evaluate = _compile(conditions, compile_nested)
+        if counts.get(key, 0) > 1:
+            evaluate = _memoized(evaluate, tick)
+        compiled[key] = evaluate
+    return compiled[key]
+
+
+def _memoized(evaluate, tick):
+    '''
+    Returns a function that calls evaluate only once per value of tick[0].
+    '''
+    cache = [None, None]
+    def memoized(data={}):
+        if cache[0] != tick[0]:
+            cache[1] = evaluate(data)
+            cache[0] = tick[0]
+        return cache[1]
+    return memoized
+
+
+def _index_leaves(conditions):
+    '''
+    Returns the list of (variable, op, constant) conditions by which a rule
+    is indexed: one 'eq' condition if there is one, else all range
+    conditions.
+    '''
+    if not isinstance(conditions, tuple) or len(conditions) != 3:
+        return []
+    if conditions[1] == 'and':
+        leaves = [_leaf(c) for c in _flatten(conditions)]
+    else:
+        leaves = [_leaf(conditions)]
+    leaves = [leaf for leaf in leaves if leaf is not None]
+    for leaf in leaves:
+        if leaf[1] == 'eq':
+            return [leaf]
+    return leaves
+
+
+def _leaf(conditions):
+    '''
+    Returns (variable, op, constant) if conditions compare a variable with a
+    constant that can be indexed, else None.
+    '''
+    if not isinstance(conditions, tuple) or len(conditions) != 3:
+        return None
+    arg1, op, arg2 = conditions
+    if op not in _REVERSED_OPERATORS:
+        return None
+    if isinstance(arg1, _STRING_TYPES) and _indexable(op, arg2):
+        return arg1, op, arg2
+    if isinstance(arg2, _STRING_TYPES) and not isinstance(arg1,
+            _STRING_TYPES) and _indexable(op, arg1):
+        return arg2, _REVERSED_OPERATORS[op], arg1
+    return None
+
+
+def _indexable(op, constant):
+    '''
+    Returns True if a comparison with <constant> can be indexed.
+    '''
+    if type(constant) in (float, int):
+        # nan is not ordered
+        return constant == constant
+    return op == 'eq' and (isinstance(constant, _STRING_TYPES) or
+            type(constant) == bool)
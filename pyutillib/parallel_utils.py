@@ -0,0 +1,161 @@
+'''
+pyutillib/parallel_utils.py
+
+Copyright (C) 2013 Edwin van Opstal
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see `<http://www.gnu.org/licenses/>`.
+'''
+
+from __future__ import division
+from __future__ import absolute_import
+
+import collections
+import itertools
+import multiprocessing
+
+import pyutillib.date_utils as du
+import pyutillib.string_utils as su
+
+
+# below this number of strings convert_many converts in the calling process
+SERIAL_THRESHOLD = 20000
+CHUNK_SIZE = 5000
+# the number of chunks per worker that are read ahead of the results
+CHUNKS_IN_FLIGHT = 2
+
+
+def _datestr2date_chunk(date_strs):
+    return list(du.datestr2date_many(date_strs))
+
+
+# the TimeParser format by the number of colons in a time string
+_TIME_FORMATS = {0: 'hhmmss', 1: 'hh:mm', 2: 'hh:mm:ss'}
+
+
+def _timestr2time_chunk(time_strs):
+    # the format is detected from the first string, strings with another
+    # format are parsed (or rejected) by timestr2time
+    fmt = 'hhmmss'
+    if time_strs:
+        fmt = _TIME_FORMATS.get(time_strs[0].count(':'), fmt)
+    return du.TimeParser(fmt).parse_many(time_strs)
+
+
+def _decstr2int_chunk(dec_strs, decimals):
+    invalid = []
+    ints = list(su.decstr2int_many(dec_strs, decimals, invalid))
+    if invalid:
+        # raises the ValueError of decstr2int
+        su.decstr2int(dec_strs[invalid[0]], decimals)
+    return ints
+
+
+# the functions that convert a list of strings, by converter name
+CONVERTERS = {
+    'datestr2date': _datestr2date_chunk,
+    'timestr2time': _timestr2time_chunk,
+    'decstr2int': _decstr2int_chunk,
+    }
+
+
+def convert_many(strs, converter, args=(), workers=None,
+        chunksize=CHUNK_SIZE, serial_threshold=SERIAL_THRESHOLD):
+    '''
+    Converts strings with one of the converters (datestr2date, timestr2time
+    or decstr2int) in a pool of worker processes. The strings are read from
+    <strs> and sent to the workers in chunks, and the results are generated
+    in the order of the strings, while the workers convert the next chunks.
+    At most CHUNKS_IN_FLIGHT chunks per worker are read ahead of the results,
+    so a long iterator of strings is not read into memory at once.
+    If <strs> has fewer than <serial_threshold> strings, or if there is only
+    1 worker, the strings are converted in the calling process, because
+    starting the processes and sending the strings costs more than it saves.
+
+    Args:
+        strs (iterable) of strings
+        converter (str) the name of the converter: 'datestr2date',
+            'timestr2time' or 'decstr2int'
+        args (tuple) the other arguments of the converter, e.g. (decimals,)
+            for decstr2int
+        workers (int) the number of worker processes, the number of cpus if
+            not specified
+        chunksize (int) the number of strings that is sent to a worker at
+            once
+        serial_threshold (int) see above
+    Returns:
+        (generator) of the converted values
+    Raises:
+        ValueError if converter is not valid, or workers or chunksize is less
+            than 1, or (while generating) if a string is not valid for the
+            converter
+    '''
+    if converter not in CONVERTERS:
+        raise ValueError('converter must be one of {}'.format(
+                sorted(CONVERTERS)))
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers < 1 or chunksize < 1:
+        raise ValueError('workers and chunksize must be at least 1')
+    return _convert_generator(iter(strs), converter, tuple(args), workers,
+            chunksize, serial_threshold)
+
+
+def _convert_generator(strs, converter, args, workers, chunksize,
+        serial_threshold):
+    '''
+    The generator of convert_many.
+    '''
+    convert = CONVERTERS[converter]
+    head = list(itertools.islice(strs, serial_threshold))
+    chunks = _chunks(itertools.chain(head, strs), chunksize)
+    if workers == 1 or len(head) < serial_threshold:
+        for chunk in chunks:
+            for value in convert(chunk, *args):
+                yield value
+        return
+    # Pool.imap would read all chunks at once, so only a limited number of
+    # chunks is sent to the workers: one new chunk for each chunk of results
+    tasks = ((converter, args, chunk) for chunk in chunks)
+    pool = multiprocessing.Pool(workers)
+    try:
+        pending = collections.deque(pool.apply_async(_convert_chunk, (task,))
+                for task in itertools.islice(tasks, CHUNKS_IN_FLIGHT * workers))
+        while pending:
+            values = pending.popleft().get()
+            for task in itertools.islice(tasks, 1):
+                pending.append(pool.apply_async(_convert_chunk, (task,)))
+            for value in values:
+                yield value
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _chunks(strs, chunksize):
+    '''
+    Generates lists with the next <chunksize> strings from <strs>.
+    '''
+    chunk = list(itertools.islice(strs, chunksize))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(strs, chunksize))
+
+
+def _convert_chunk(task):
+    '''
+    Converts a chunk of strings in a worker process.
+    '''
+    converter, args, chunk = task
+    return CONVERTERS[converter](chunk, *args)
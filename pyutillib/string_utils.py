@@ -21,8 +21,13 @@ from __future__ import division
 from __future__ import absolute_import
 
 import ast
+import binascii
+import itertools
+import os
 import random
+import re
 import string
+import threading
 
 
 def random_string(length=8, charset=None):
@@ -45,23 +50,331 @@ def random_string(length=8, charset=None):
     return ''.join(random.choice(charset) for unused in xrange(length))
 
 
-def safe_eval(str_in):
+def random_strings(count, length=8, charset=None, secure=False):
     '''
-    Extracts a python object from a string.
+    Generates a list of strings with random characters, like random_string.
+    The random bytes are drawn in large blocks and mapped to the characters
+    with a translation table. Bytes that would make some characters more
+    likely than others are discarded. If no charset is specified, only
+    letters and digits are used.
+
+    Args:
+        count (int) number of strings
+        length (int) length of the strings
+        charset (string) list of at most 256 characters to choose from, 
+            with codes < 256
+        secure (bool) use os.urandom, which is suitable for cryptographic
+            use, instead of the random module
+    Returns:
+        (list) of strings with random characters from charset
+    Raises:
+        ValueError if length < 1, or if charset has too many characters or
+            characters with codes >= 256
+    '''
+    if length < 1:
+        raise ValueError('Length must be > 0')
+    if not charset:
+        charset = string.ascii_letters + string.digits
+    try:
+        chars = charset if isinstance(charset, bytes) else \
+                charset.encode('latin-1')
+    except UnicodeError:
+        raise ValueError('charset characters must have codes < 256')
+    if len(chars) > 256:
+        raise ValueError('charset can have at most 256 characters')
+    # byte b is mapped to chars[b % n_chars], bytes >= limit are discarded
+    n_chars = len(chars)
+    limit = 256 - 256 % n_chars
+    codes = bytearray(chars)
+    table = bytes(bytearray(codes[b % n_chars] for b in range(256)))
+    discard = bytes(bytearray(range(limit, 256)))
+    random_bytes = os.urandom if secure else _random_bytes
+    n_needed = count * length
+    text = b''
+    while len(text) < n_needed:
+        n_bytes = (n_needed - len(text)) * 256 // limit + 64
+        text += random_bytes(n_bytes).translate(table, discard)
+    if not isinstance(charset, bytes):
+        text = text.decode('latin-1')
+    return [text[i:i + length] for i in range(0, n_needed, length)]
+
+
+def _random_bytes(n_bytes):
+    '''
+    Returns a string of n_bytes random bytes from the random module.
+    '''
+    return binascii.unhexlify('%0*x' % (2 * n_bytes, 
+            random.getrandbits(8 * n_bytes)))
+
+
+class LRUCache(object):
+    '''
+    A dict-like cache that holds at most <maxsize> items. When it is full, the
+    least recently used quarter of the items is discarded in one go, so that a
+    lookup only has to update a counter. The number of hits and misses of get
+    are counted. The cache can be used from several threads.
+    '''
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = {}
+        self._clock = itertools.count()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        '''
+        Returns the cached value for <key>, or <default> if there is none.
+        '''
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            item[0] = next(self._clock)
+            return item[1]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._items[key] = [next(self._clock), value]
+            if len(self._items) > self.maxsize:
+                lru = sorted(self._items, key=lambda k: self._items[k][0])
+                for old_key in lru[:len(lru) - self.maxsize * 3 // 4]:
+                    del self._items[old_key]
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        '''
+        Removes all items from the cache and resets the statistics.
+        '''
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        '''
+        Returns a dict with the statistics of the cache.
+        '''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 
+                    'maxsize': self.maxsize, 'size': len(self._items)}
+
+
+# the results of safe_eval by string, set maxsize to 0 to disable caching
+literal_cache = LRUCache(1024)
+_MISSING = object()
+
+SAFE_EVAL_ENGINES = ('ast', 'fast')
+# the engine that safe_eval uses if no engine is specified
+safe_eval_engine = 'ast'
+
+
+def safe_eval(str_in, engine=None):
+    '''
+    Extracts a python object from a string. The results are cached in
+    literal_cache, mutable results (lists, dicts, sets) are copied, so that
+    changing them doesn't change the cache.
+
+    There are 2 engines:
+        'ast' uses ast.literal_eval
+        'fast' uses a single pass parser for strings with only numbers,
+            (ASCII) strings without escapes, True, False, None and
+            tuples, lists and dicts of those. For other strings it falls
+            back to ast.literal_eval, so the results are the same.
 
     Args:
         str_in (string) that contains python variable
+        engine (str) 'ast' or 'fast', if not specified safe_eval_engine is
+            used
     Returns:
         (object) of standard python type or None of no valid object was found.
     Raises:
-        -
+        ValueError if engine is not valid
+    '''
+    obj, immutable = _shared_literal(str_in, engine)
+    return obj if immutable else _copy_literal(obj)
+
+
+def _shared_literal(str_in, engine=None):
+    '''
+    Returns (obj, immutable) for str_in, like safe_eval, but without copying
+    mutable results. obj may be the object in literal_cache, so it must not
+    be changed.
+    '''
+    engine = engine or safe_eval_engine
+    if engine not in SAFE_EVAL_ENGINES:
+        raise ValueError('engine must be one of {}'.format(SAFE_EVAL_ENGINES))
+    if literal_cache.maxsize:
+        try:
+            # 'a' == u'a', but the results may differ in Python 2
+            key = (type(str_in), str_in)
+            cached = literal_cache.get(key, _MISSING)
+        except TypeError:
+            pass
+        else:
+            if cached is _MISSING:
+                obj = _literal_eval(str_in, engine)
+                cached = literal_cache[key] = (obj, _is_immutable(obj))
+            return cached
+    # nothing is shared, so the result doesn't have to be copied
+    return _literal_eval(str_in, engine), True
+
+
+def _literal_eval(str_in, engine='ast'):
     '''
+    Returns ast.literal_eval(str_in), or None if that fails.
+    '''
+    if engine == 'fast':
+        try:
+            return _fast_literal_eval(str_in)
+        except _Unsupported:
+            pass
     try:
         return ast.literal_eval(str_in)
     except:
         return None
 
 
+class _Unsupported(Exception):
+    '''
+    Raised if _fast_literal_eval can't parse a string.
+    '''
+
+
+# the literal tokens, any other character is matched by the last group
+_LITERAL_TOKENS = re.compile(r'''[ ]*(?:
+    (-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    |('[\x20-\x26\x28-\x5b\x5d-\x7e]*'|"[\x20\x21\x23-\x5b\x5d-\x7e]*")
+    |(True\b|False\b|None\b)
+    |([()\[\]{},:])
+    |([\s\S])
+    )''', re.VERBOSE)
+_NAMES = {'True': True, 'False': False, 'None': None}
+_CLOSING = {'(': ')', '[': ']', '{': '}'}
+
+
+def _fast_literal_eval(str_in):
+    '''
+    Returns the object in str_in, like ast.literal_eval, for the subset of
+    literals described in safe_eval. The string is split into tokens with
+    one regular expression, and the containers are built with a stack.
+
+    Raises:
+        _Unsupported if str_in is not in the subset, or is not valid
+    '''
+    if not isinstance(str_in, str) or str_in[:1] == ' ':
+        # leading spaces are handled differently by Python versions
+        raise _Unsupported()
+    stack = []
+    opener = ''  # the opening symbol of the current container
+    items = []
+    expect_value = True
+    comma = False  # the last token was a comma
+    for number, text, name, symbol, other in _LITERAL_TOKENS.findall(
+            str_in.rstrip(' ')):
+        if number:
+            value = _number(number)
+        elif text:
+            value = text[1:-1]
+        elif name:
+            value = _NAMES[name]
+        elif symbol in _CLOSING:
+            if not expect_value:
+                raise _Unsupported()
+            stack.append((opener, items, comma))
+            opener, items, comma = symbol, [], False
+            continue
+        elif symbol == ',':
+            if expect_value or not opener or (opener == '{' and
+                    len(items) % 2):
+                raise _Unsupported()
+            expect_value = comma = True
+            continue
+        elif symbol == ':':
+            if expect_value or opener != '{' or not len(items) % 2:
+                raise _Unsupported()
+            expect_value = True
+            continue
+        elif symbol:
+            # closing symbol
+            if symbol != _CLOSING.get(opener) or (expect_value and items
+                    and not comma):
+                raise _Unsupported()
+            if opener == '[':
+                value = items
+            elif opener == '{':
+                if len(items) % 2:
+                    # a set
+                    raise _Unsupported()
+                try:
+                    value = dict(zip(items[::2], items[1::2]))
+                except TypeError:
+                    # unhashable key
+                    raise _Unsupported()
+            elif len(items) == 1 and not comma:
+                # parentheses without a comma are not a tuple
+                value = items[0]
+            else:
+                value = tuple(items)
+            opener, items, comma = stack.pop()
+            # the container was opened where a value was expected
+            expect_value = True
+        else:
+            raise _Unsupported()
+        if not expect_value:
+            raise _Unsupported()
+        items.append(value)
+        expect_value = comma = False
+    if opener or len(items) != 1:
+        raise _Unsupported()
+    return items[0]
+
+
+def _number(token):
+    '''
+    Returns the int or float for a number token.
+    '''
+    if '.' in token or 'e' in token or 'E' in token:
+        return float(token)
+    digits = token.lstrip('-')
+    if len(digits) > 18 or (digits[0] == '0' and len(digits) > 1):
+        # avoid Python 2 longs and octals
+        raise _Unsupported()
+    return int(token)
+
+
+def _is_immutable(obj):
+    '''
+    Returns True if obj, the result of ast.literal_eval, can not be changed.
+    '''
+    if isinstance(obj, (list, dict, set)):
+        return False
+    elif isinstance(obj, tuple):
+        return all(_is_immutable(item) for item in obj)
+    return True
+
+
+def _copy_literal(obj):
+    '''
+    Returns a deep copy of obj, the result of ast.literal_eval. Keys of dicts
+    and items of sets are immutable, so they are not copied.
+    '''
+    if isinstance(obj, list):
+        return [_copy_literal(item) for item in obj]
+    elif isinstance(obj, dict):
+        return dict((key, _copy_literal(value)) for key, value in obj.items())
+    elif isinstance(obj, set):
+        return set(obj)
+    elif isinstance(obj, tuple):
+        return tuple(_copy_literal(item) for item in obj)
+    return obj
+
+
 def str2dict(str_in):
     '''
     Extracts a dict from a string.
@@ -109,10 +422,11 @@ def str2dict_keys(str_in):
     Raises:
         -
     '''
-    tmp_dict = str2dict(str_in)
-    if tmp_dict is None:
+    dict_in, _ = _shared_dict(str_in)
+    if dict_in is None:
         return None
-    return sorted([k for k in tmp_dict])
+    # keys are immutable, so they don't have to be copied
+    return sorted(dict_in)
 
 
 #used to be get_dict_values
@@ -128,10 +442,46 @@ def str2dict_values(str_in):
     Raises:
         -
     '''
-    tmp_dict = str2dict(str_in)
-    if tmp_dict is None:
+    dict_in, shared = _shared_dict(str_in)
+    if dict_in is None:
+        return None
+    if shared:
+        return [_copy_literal(dict_in[key]) for key in sorted(dict_in)]
+    return [dict_in[key] for key in sorted(dict_in)]
+
+
+def str2dict_items(str_in):
+    '''
+    Extracts the (key, value) pairs from a string that represents a dict and
+    returns them sorted by key. The dict is parsed (or taken from
+    literal_cache) once and the keys are sorted once. Unlike str2dict, the
+    dict itself is not copied, only the values (if it is in literal_cache).
+
+    Args:
+        str_in (string) that contains python dict
+    Returns:
+        (list) with (key, value) tuples or None if no valid dict was found
+    Raises:
+        -
+    '''
+    dict_in, shared = _shared_dict(str_in)
+    if dict_in is None:
         return None
-    return [tmp_dict[key] for key in sorted(k for k in tmp_dict)]
+    if shared:
+        return [(key, _copy_literal(dict_in[key])) for key in sorted(dict_in)]
+    return [(key, dict_in[key]) for key in sorted(dict_in)]
+
+
+def _shared_dict(str_in):
+    '''
+    Returns (dict, shared) for the dict in str_in, or (None, False) if there
+    is no valid dict. If shared is True, the dict is in literal_cache, and
+    it and its values must not be changed.
+    '''
+    dict_in, immutable = _shared_literal(str_in)
+    if not isinstance(dict_in, dict):
+        return None, False
+    return dict_in, not immutable
 
 
 def decstr2int(dec_str, decimals):
@@ -174,3 +524,57 @@ def decstr2int(dec_str, decimals):
         return int(int(dollars) * (10 ** decimals)) + cents
     except:
         raise ValueError('Invalid decimal string')
+
+
+def decstr2int_many(dec_strs, decimals, invalid=None, default=None):
+    '''
+    Returns a generator that turns decimal strings into integers like
+    decstr2int does. Strings that contain only digits and a decimal point are
+    converted without exception handling, other strings are passed to
+    decstr2int. Invalid strings, and values that are not strings (e.g. None),
+    don't stop the conversion.
+
+    Arguments:
+        dec_strs (iterable) of strings that represent decimal numbers
+        decimals (int): number of decimals for creating the integer output
+        invalid (list) if specified, the indexes of the invalid strings and
+            of the values that are not strings are appended to it
+        default the value that is generated for an invalid string
+    Returns:
+        (generator) of ints
+    Raises:
+        TypeError if decimals is not an integer
+    '''
+    if not isinstance(decimals, int):
+        raise TypeError('decimals must be an integer')
+    return _decstr2int_generator(dec_strs, decimals, invalid, default)
+
+
+def _decstr2int_generator(dec_strs, decimals, invalid, default):
+    '''
+    The generator of decstr2int_many.
+    '''
+    scale = 10 ** decimals
+    zeros = '0' * decimals
+    for i, dec_str in enumerate(dec_strs):
+        try:
+            dollars, point, cents = dec_str.partition('.')
+        except AttributeError:
+            # not a string, e.g. None, decstr2int rejects it below
+            dollars = cents = ''
+        # only ascii digits, isdigit is also True for e.g. u'\xb2'
+        if dollars and not dollars.strip(string.digits) and \
+                not cents.strip(string.digits):
+            if decimals < 1:
+                yield int(int(dollars) * scale)
+            else:
+                # shift the decimal point in the string
+                yield int(dollars + (cents + zeros)[:decimals])
+            continue
+        try:
+            value = decstr2int(dec_str, decimals)
+        except (ValueError, AttributeError):
+            if invalid is not None:
+                invalid.append(i)
+            value = default
+        yield value
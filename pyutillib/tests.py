@@ -23,11 +23,24 @@ along with this program.  If not, see `<http://www.gnu.org/licenses/>`.
 from __future__ import division
 from __future__ import absolute_import
 
-from unittest import TestCase, main
+from unittest import TestCase, main, skipIf
 import datetime as dt
+import os
+import pickle
+import random
+import shutil
+import string
+import tempfile
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 import pyutillib.date_utils as du
 import pyutillib.math_utils as mu
+import pyutillib.parallel_utils as pu
 import pyutillib.string_utils as su
 
 
@@ -84,6 +97,26 @@ class TestDateUtils(TestCase):
             self.assertRaises(ValueError, du.datestr2date, date)
 
 
+    def test_datestr2date_many(self):
+        date_strs = [data['str'] for data in self.validdata]
+        for i in range(len(date_strs)):
+            # every format as the first (detected) format
+            strs = date_strs[i:] + date_strs[:i] + date_strs
+            self.assertEqual(list(du.datestr2date_many(strs)),
+                    [du.datestr2date(s) for s in strs])
+        self.assertEqual(list(du.datestr2date_many([])), [])
+        dates = du.datestr2date_many(['20000131', '20000230'])
+        self.assertEqual(next(dates), dt.date(2000, 1, 31))
+        self.assertRaises(ValueError, next, dates)
+        for date_strs in (['20000131', '2000013a'], ['1/2/00', '1/2//00'],
+                ['1-2-00', '1-2-+0'], ['1'], ['31/1/00'],
+                # other digits than ascii digits, like datestr2date
+                [u'\u0662\u0660\u0660\u0660\u0660\u0661\u0663\u0661'],
+                ['20000131', u'2000013\u0661'], [u'1-2-\u0660\u0660']):
+            self.assertRaises(ValueError, list, du.datestr2date_many(date_strs))
+            self.assertRaises(ValueError, du.datestr2date, date_strs[-1])
+
+
     def test_date2datestr(self):
         #default fmt:
         self.assertEqual(du.date2datestr(self.validdata[0]['date']), 
@@ -98,6 +131,70 @@ class TestDateUtils(TestCase):
             self.assertRaises(ValueError, du.date2datestr, date, fmt)
 
 
+    def test_date_formatter(self):
+        for data in self.validdata:
+            formatter = du.DateFormatter(data['fmt'])
+            self.assertEqual(formatter.format(data['date']), data['str'])
+            self.assertEqual(formatter.format_many([data['date']] * 2),
+                    [data['str']] * 2)
+        formatter = du.DateFormatter()
+        self.assertEqual(formatter.format(dt.date(1, 2, 3)), '00010203')
+        self.assertEqual(du.DateFormatter('m/d/yy').format(dt.date(1999, 2, 
+                3)), '2/3/99')
+        dates = [dt.date(2013, 1, 1) + dt.timedelta(days=n) 
+                for n in range(400)]
+        self.assertEqual(formatter.format_many(dates), 
+                [d.strftime('%Y%m%d') for d in dates])
+        for fmt in ('dmy', 'd/m/y', 'dd/mm/yy', 'mm-dd-yy', 'yy-mm-dd',
+                'yyymmdd', 'd-m-yyy', 'ddd-m-yy', 'm/ddd/yy'):
+            self.assertRaises(ValueError, du.DateFormatter, fmt)
+
+
+    def test_date_table(self):
+        for data in self.validdata:
+            table = du.DateTable(data['fmt'])
+            self.assertEqual(table.format(data['date']), data['str'])
+            self.assertEqual(table.format(data['date']), data['str'])
+            self.assertEqual(table.parse(data['str']), data['date'])
+            self.assertEqual(table.parse_many([data['str']] * 2),
+                    [data['date']] * 2)
+        table = du.DateTable('d-m-yy', dt.date(1999, 12, 30),
+                dt.date(2000, 1, 2))
+        dates = [dt.date(1999, 12, 29) + dt.timedelta(days=n)
+                for n in range(6)]
+        self.assertEqual(table.format_many(dates), ['29-12-99', '30-12-99',
+                '31-12-99', '1-1-00', '2-1-00', '3-1-00'])
+        self.assertEqual(table.format(dt.datetime(2000, 1, 1, 12)), '1-1-00')
+        # only the strings that datestr2date parses to the same date
+        self.assertEqual(sorted(table._dates), ['1-1-00', '2-1-00'])
+        self.assertEqual(table.parse('30-12-99'), dt.date(2099, 12, 30))
+        self.assertEqual(table.parse('01-01-00'), dt.date(2000, 1, 1))
+        self.assertRaises(ValueError, table.parse, '32-1-00')
+        self.assertRaises(ValueError, du.DateTable, 'dmy')
+        self.assertRaises(ValueError, du.DateTable, 'yyyymmdd', dates[1],
+                dates[0])
+
+    def test_use_date_table(self):
+        table = du.use_date_table('d-m-yyyy', dt.date(2012, 1, 1),
+                dt.date(2012, 12, 31))
+        try:
+            self.assertEqual(du.date2datestr(dt.date(2012, 3, 4), 'd-m-yyyy'),
+                    '4-3-2012')
+            self.assertEqual(du.date2datestr(dt.date(2013, 3, 4), 'd-m-yyyy'),
+                    '4-3-2013')
+            # datestr2date does not use the table, parse does
+            self.assertEqual(du.datestr2date('5-3-2012'), dt.date(2012, 3, 5))
+            self.assertEqual(table._dates, {'4-3-2012': dt.date(2012, 3, 4)})
+            self.assertEqual(table.parse('20120306'), dt.date(2012, 3, 6))
+            self.assertEqual(table._dates, {'4-3-2012': dt.date(2012, 3, 4),
+                    '6-3-2012': dt.date(2012, 3, 6)})
+        finally:
+            du.clear_date_tables()
+        self.assertNotIsInstance(du._date_formatters.get('d-m-yyyy'),
+                du.DateTable)
+        self.assertEqual(du._date_tables, {})
+
+
     def test_is_weekday(self):
         for date in self.weekdays:
             self.assertTrue(du.is_weekday(date))
@@ -112,6 +209,36 @@ class TestDateUtils(TestCase):
             self.assertTrue(du.is_weekend(date))
 
 
+    def check_weekday_many(self, to_dates):
+        dates = [dt.date(2013, 2, 20) + dt.timedelta(days=n) 
+                for n in range(-20, 20)]
+        for dates_in in (dates, du.CompactDateList(dates), to_dates(dates)):
+            self.assertEqual(list(du.is_weekday_many(dates_in)),
+                    [du.is_weekday(date) for date in dates])
+            self.assertEqual(list(du.is_weekend_many(dates_in)),
+                    [du.is_weekend(date) for date in dates])
+            self.assertEqual(list(to_dates(du.previous_weekday_many(
+                    dates_in))), list(to_dates([du.previous_weekday(date)
+                    for date in dates])))
+            self.assertEqual(list(to_dates(du.next_weekday_many(dates_in))),
+                    list(to_dates([du.next_weekday(date) for date in dates])))
+
+    @skipIf(numpy is None, 'numpy is not installed')
+    def test_weekday_many_numpy(self):
+        self.check_weekday_many(lambda dates: numpy.array(dates, 
+                dtype='datetime64[D]'))
+        self.assertEqual(du.is_weekday_many([dt.date(2013, 2, 20)]).dtype,
+                bool)
+
+    def test_weekday_many_python(self):
+        du_numpy = du.numpy
+        du.numpy = None
+        try:
+            self.check_weekday_many(list)
+        finally:
+            du.numpy = du_numpy
+
+
     def test_previous_weekday(self):
         for day1, day2 in ((8,7), (9,7), (10,7), (11,10), (12,11), (13,12), 
                            (14,13), (15,14), (16,14), (17,14)):
@@ -126,6 +253,88 @@ class TestDateUtils(TestCase):
                     dt.date(2000,1,day2))
 
 
+    def test_add_weekdays(self):
+        for day in range(1, 15):
+            date = dt.date(2013, 4, day)
+            self.assertEqual(du.add_weekdays(date, 0), date)
+            self.assertEqual(du.add_weekdays(date, 1), du.next_weekday(date))
+            self.assertEqual(du.add_weekdays(date, -1),
+                    du.previous_weekday(date))
+            for n_days in range(2, 30):
+                expected = du.next_weekday(date)
+                for unused in range(n_days - 1):
+                    expected = du.next_weekday(expected)
+                self.assertEqual(du.add_weekdays(date, n_days), expected)
+                expected = du.previous_weekday(date)
+                for unused in range(n_days - 1):
+                    expected = du.previous_weekday(expected)
+                self.assertEqual(du.add_weekdays(date, -n_days), expected)
+        # Friday 3 May, Monday 6 May and Tuesday 7 May and a Saturday
+        holidays = [dt.date(2013, 5, 6), dt.date(2013, 5, 3), 
+                dt.date(2013, 5, 7), dt.date(2013, 5, 4)]
+        for holidays in (holidays, du.DateList(holidays), set(holidays),
+                du.HolidayCalendar(holidays)):
+            self.assertEqual(du.add_weekdays(dt.date(2013, 5, 2), 1,
+                    holidays), dt.date(2013, 5, 8))
+            self.assertEqual(du.add_weekdays(dt.date(2013, 5, 1), 3,
+                    holidays), dt.date(2013, 5, 9))
+            self.assertEqual(du.add_weekdays(dt.date(2013, 5, 8), -1,
+                    holidays), dt.date(2013, 5, 2))
+            self.assertEqual(du.add_weekdays(dt.date(2013, 5, 9), -4,
+                    holidays), dt.date(2013, 4, 30))
+
+    def test_weekdays_between(self):
+        date = dt.date(2013, 4, 10)
+        for n_days in range(-20, 20):
+            self.assertEqual(du.weekdays_between(date, 
+                    du.add_weekdays(date, n_days)), n_days)
+        # from Saturday to Sunday, Monday
+        self.assertEqual(du.weekdays_between(dt.date(2013, 4, 13),
+                dt.date(2013, 4, 14)), 0)
+        self.assertEqual(du.weekdays_between(dt.date(2013, 4, 13),
+                dt.date(2013, 4, 15)), 1)
+        holidays = [dt.date(2013, 4, 15), dt.date(2013, 4, 14), 
+                dt.date(2013, 4, 15)]
+        for holidays in (holidays, du.DateList(holidays),
+                du.HolidayCalendar(holidays)):
+            self.assertEqual(du.weekdays_between(dt.date(2013, 4, 12),
+                    dt.date(2013, 4, 17), holidays), 2)
+            self.assertEqual(du.weekdays_between(dt.date(2013, 4, 17),
+                    dt.date(2013, 4, 12), holidays), -2)
+
+    def test_holiday_calendar(self):
+        # weekend days and duplicates are not counted
+        calendar = du.HolidayCalendar([dt.date(2013, 4, 15), 
+                dt.date(2013, 4, 14), dt.date(2013, 4, 15), 
+                dt.date(2013, 4, 1), dt.date(2013, 4, 30)])
+        self.assertEqual(len(calendar), 3)
+        self.assertTrue(dt.date(2013, 4, 15) in calendar)
+        self.assertFalse(dt.date(2013, 4, 14) in calendar)
+        self.assertFalse(dt.date(2013, 5, 1) in calendar)
+        self.assertEqual(calendar.count(dt.date(2013, 4, 1), 
+                dt.date(2013, 4, 30)), 2)
+        self.assertEqual(calendar.count(dt.date(2013, 3, 31), 
+                dt.date(2013, 4, 29)), 2)
+        self.assertEqual(calendar.count(dt.date(2013, 4, 15),
+                dt.date(2013, 4, 15)), 0)
+        self.assertEqual(du.HolidayCalendar().count(dt.date(2013, 4, 1), 
+                dt.date(2013, 4, 30)), 0)
+
+    def test_weekday_range(self):
+        fromdate = dt.date(2013, 4, 13)
+        todate = dt.date(2013, 4, 30)
+        expected = [date for date in (fromdate + dt.timedelta(days=n) 
+                for n in range(18)) if du.is_weekday(date)]
+        self.assertEqual(list(du.weekday_range(fromdate, todate)), expected)
+        holidays = [dt.date(2013, 4, 30), dt.date(2013, 4, 1),
+                dt.date(2013, 4, 15), dt.date(2013, 4, 20)]
+        self.assertEqual(list(du.weekday_range(fromdate, todate, holidays)),
+                expected[1:-1])
+        self.assertEqual(list(du.weekday_range(fromdate, todate,
+                du.HolidayCalendar(holidays))), expected[1:-1])
+        self.assertEqual(list(du.weekday_range(todate, fromdate)), [])
+
+
     def test_last_year(self):
         self.assertEqual(du.last_year(dt.date(2000,3,29)), dt.date(1999,3,29))
         self.assertEqual(du.last_year(dt.date(2000,2,27)), dt.date(1999,2,27))
@@ -164,15 +373,50 @@ class TestDateUtils(TestCase):
             self.assertRaises(ValueError, du.time2timestr, time, fmt)
 
 
+    def test_time_formatter(self):
+        for time in self.validtime:
+            formatter = du.TimeFormatter(time['fmt'])
+            self.assertEqual(formatter.format(time['time']), time['str'])
+            self.assertEqual(formatter.format_many([time['time']] * 2),
+                    [time['str']] * 2)
+        for fmt in ('hmmss', 'hhmss', 'hhmms', 'hmm', 'hhmm', 'hh:m:ss',
+                'hh:mm:s', 'hh:m', 'h:m', 'hhh:mm'):
+            self.assertRaises(ValueError, du.TimeFormatter, fmt)
+
+    def test_time_parser(self):
+        time_strs = [time['str'] for time in self.validtime] + ['000000',
+                '0:00', '23:59:59', '1:05pm', '25:02', '12:0:12', '123456',
+                # other digits than ascii digits
+                u'\u0661\u0662:\u0660\u0661', u'12:00:0\u0661',
+                u'\u0661\u0662\u0660\u0660\u0660\u0660']
+        for fmt in ('hhmmss', 'hh:mm:ss', 'h:mm', 'hh:mm'):
+            parser = du.TimeParser(fmt)
+            for time_str in time_strs:
+                try:
+                    expected = du.timestr2time(time_str)
+                except ValueError:
+                    self.assertRaises(ValueError, parser.parse, time_str)
+                    self.assertRaises(ValueError, parser.parse_many, 
+                            [time_str])
+                else:
+                    self.assertEqual(parser.parse(time_str), expected)
+                    self.assertEqual(parser.parse_many(iter([time_str])),
+                            [expected])
+        self.assertEqual(du.TimeParser().parse('000000'), dt.time(0, 0))
+        self.assertRaises(ValueError, du.TimeParser, 'hmmss')
+
+
 class DateListTests(TestCase):
 
+    datelist_class = du.DateList
+
     def setUp(self):
         self.range = range(0, 31)
         self.range_gaps = range(0,31,4)
         self.indates = [dt.date(2012,1,x+1) for x in self.range]
         self.indates_gaps = [dt.date(2012,1,x+1) for x in self.range_gaps]
-        self.dates = du.DateList(self.indates)
-        self.dates_gaps = du.DateList(self.indates_gaps)
+        self.dates = self.datelist_class(self.indates)
+        self.dates_gaps = self.datelist_class(self.indates_gaps)
 
     def test_index(self):
         # continuous
@@ -194,6 +438,34 @@ class DateListTests(TestCase):
             self.assertEqual(self.dates.index(indate), i_in)
             self.assertEqual(self.dates_gaps.index(indate), i_in // 4)
 
+    def test_index_duplicates(self):
+        dates = self.datelist_class([dt.date(2012, 1, 1), dt.date(2012, 1, 3),
+                dt.date(2012, 1, 3), dt.date(2012, 1, 5)])
+        self.assertEqual(dates.index(dt.date(2012, 1, 3)), 1)
+        # the first of the latest dates before a date that is not in the list
+        self.assertEqual(dates.index(dt.date(2012, 1, 4)), 1)
+        self.assertEqual(dates.index(dt.date(2012, 1, 6)), 3)
+        dates = self.datelist_class([dt.date(2012, 1, 1), dt.date(2012, 1, 1),
+                dt.date(2012, 1, 3), dt.date(2012, 1, 3), dt.date(2012, 1, 3)])
+        queries = [dt.date(2011, 12, 31), dt.date(2012, 1, 1), 
+                dt.date(2012, 1, 2), dt.date(2012, 1, 3), dt.date(2012, 1, 4)]
+        expected = [0, 0, 0, 2, 4]
+        self.assertEqual([dates.index(date) for date in queries], expected)
+        view = du.DateListView(dates, 0, len(dates))
+        self.assertEqual([view.index(date) for date in queries], expected)
+        short_view = view[1:4]
+        self.assertEqual([short_view.index(date) for date in queries], 
+                [0, 0, 0, 1, 2])
+        du_numpy = du.numpy
+        try:
+            for du.numpy in set([du_numpy, None]):
+                self.assertEqual(list(dates.index_many(queries)), expected)
+                self.assertEqual(list(view.index_many(queries)), expected)
+                self.assertEqual(list(short_view.index_many(queries)), 
+                        [0, 0, 0, 1, 2])
+        finally:
+            du.numpy = du_numpy
+
     def test_on_or_before(self):
         self.assertEqual(self.dates.on_or_before(dt.date(2011, 11, 30)),
                     self.dates[0])
@@ -259,6 +531,248 @@ class DateListTests(TestCase):
                 self.indates_gaps[3:6])
 
 
+    def test_view(self):
+        view = self.dates.subset(self.indates[5], self.indates[20])
+        self.assertIsInstance(view, du.DateListView)
+        self.assertEqual(view, self.indates[5:21])
+        self.assertEqual(self.indates[5:21], view)
+        self.assertNotEqual(view, self.indates[5:20])
+        self.assertEqual(len(view), 16)
+        self.assertEqual(view[0], self.indates[5])
+        self.assertEqual(view[-1], self.indates[20])
+        self.assertRaises(IndexError, view.__getitem__, 16)
+        self.assertEqual(view[2:4], self.indates[7:9])
+        self.assertEqual(view[::5], self.indates[5:21:5])
+        self.assertIn(self.indates[10], view)
+        self.assertNotIn(self.indates[4], view)
+        # the methods of DateList, the indexes are relative to the view
+        self.assertEqual(view.index(self.indates[7]), 2)
+        self.assertEqual(view.index(self.indates[0]), 0)
+        self.assertEqual(view.index(self.indates[30]), 15)
+        self.assertEqual(view.on_or_before(self.indates[30]),
+                self.indates[20])
+        self.assertEqual(view.offset(self.indates[18], 5), self.indates[20])
+        self.assertEqual(view.delta(self.indates[6], self.indates[9]), 3)
+        self.assertEqual(list(view.index_many([self.indates[30],
+                self.indates[6]])), [15, 1])
+        # nested views refer to the original list
+        nested = view.subset(self.indates[8], self.indates[12])
+        self.assertIs(nested._parent, self.dates)
+        self.assertEqual(nested, self.indates[8:13])
+        self.assertEqual(nested.index(self.indates[10]), 2)
+        materialized = nested.materialize()
+        self.assertIsInstance(materialized, self.datelist_class)
+        self.assertEqual(materialized, self.indates[8:13])
+        self.assertEqual(self.dates.subset(self.indates[30],
+                self.indates[0]), [])
+
+    def test_windows(self):
+        windows = list(self.dates_gaps.windows(3, 2))
+        self.assertEqual(windows, [self.indates_gaps[0:3],
+                self.indates_gaps[2:5], self.indates_gaps[4:7]])
+        self.assertIsInstance(windows[0], du.DateListView)
+        self.assertEqual(list(self.dates_gaps.windows(7, indexes=True)),
+                [(0, 7), (1, 8)])
+        self.assertEqual(list(self.dates_gaps.windows(9)), [])
+        self.assertRaises(ValueError, self.dates.windows, 0)
+        self.assertRaises(ValueError, self.dates.windows, 2, 0)
+
+    def test_windows_by_calendar(self):
+        span = dt.timedelta(days=9)
+        windows = list(self.dates_gaps.windows_by_calendar(span))
+        self.assertEqual(len(windows), len(self.indates_gaps))
+        for date, window in zip(self.indates_gaps, windows):
+            self.assertEqual(window, [d for d in self.indates_gaps
+                    if date - span < d <= date])
+        self.assertEqual(list(self.dates.windows_by_calendar(
+                dt.timedelta(days=2), indexes=True))[:3],
+                [(0, 1), (0, 2), (1, 3)])
+        self.assertRaises(ValueError, self.dates.windows_by_calendar,
+                dt.timedelta(0))
+
+    def test_save_load(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'dates.bin')
+            self.dates_gaps.save(path)
+            self.assertEqual(os.path.getsize(path), 16 + 4 * 8)
+            loaded = du.CompactDateList.load(path)
+            self.assertEqual(loaded, self.indates_gaps)
+            self.assertEqual(loaded[2:5], self.indates_gaps[2:5])
+            self.assertEqual(loaded[::3], self.indates_gaps[::3])
+            self.assertEqual(loaded[-1], self.indates_gaps[-1])
+            self.assertEqual(loaded.index(self.indates[10]), 2)
+            self.assertIn(self.indates[8], loaded)
+            self.assertEqual(loaded, du.CompactDateList(self.indates_gaps))
+            self.assertEqual(loaded.offset_many([self.indates[10]], 2),
+                    [self.indates_gaps[4]])
+            self.assertEqual(list(du.is_weekday_many(loaded)),
+                    [du.is_weekday(date) for date in self.indates_gaps])
+            du_numpy = du.numpy
+            du.numpy = None
+            try:
+                self.assertEqual(loaded.offset_many([self.indates[10]], 2),
+                        [self.indates_gaps[4]])
+            finally:
+                du.numpy = du_numpy
+            self.dates.subset(self.indates[3], self.indates[5]).save(path)
+            self.assertEqual(du.CompactDateList.load(path),
+                    self.indates[3:6])
+            self.datelist_class([]).save(path)
+            self.assertEqual(du.CompactDateList.load(path), [])
+            with open(path, 'wb') as file_:
+                file_.write(b'DATELIST\x01\x00\x00\x00\x02\x00\x00\x00')
+            self.assertRaises(ValueError, du.CompactDateList.load, path)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def check_many(self):
+        queries = [dt.date(2011, 12, 1), dt.date(2012, 3, 1)] + \
+                self.indates[::-3]
+        for dates in (self.dates, self.dates_gaps):
+            self.assertEqual(list(dates.index_many(queries)),
+                    [dates.index(date) for date in queries])
+            for n_days in (-40, -3, 0, 2, 40):
+                self.assertEqual(dates.offset_many(queries, n_days),
+                        [dates.offset(date, n_days) for date in queries])
+            self.assertEqual(list(dates.delta_many(queries, queries[::-1])),
+                    [dates.delta(fromdate, todate) for fromdate, todate
+                    in zip(queries, queries[::-1])])
+        self.assertEqual(list(self.dates.index_many([])), [])
+        for fromdates, todates in ((queries[:1], queries[:3]),
+                (queries[:3], queries[:2]), (queries, [])):
+            self.assertRaises(ValueError, self.dates.delta_many, fromdates,
+                    iter(todates))
+        self.assertEqual(list(self.datelist_class([]).index_many(queries)),
+                [0] * len(queries))
+
+    @skipIf(numpy is None, 'numpy is not installed')
+    def test_many_numpy(self):
+        self.check_many()
+
+    def test_many_python(self):
+        du_numpy = du.numpy
+        du.numpy = None
+        try:
+            self.check_many()
+        finally:
+            du.numpy = du_numpy
+
+    def test_periods(self):
+        indates = [dt.date(2011, 12, 30), dt.date(2012, 1, 2),
+                dt.date(2012, 1, 6), dt.date(2012, 2, 29), dt.date(2012, 4, 2),
+                dt.date(2012, 4, 3)]
+        dates = self.datelist_class(indates)
+        self.assertEqual(dates.first_of_period(dt.date(2012, 1, 4), 'week'),
+                indates[1])
+        self.assertEqual(dates.last_of_period(dt.date(2012, 1, 4), 'week'),
+                indates[2])
+        self.assertEqual(dates.first_of_period(dt.date(2012, 2, 1), 'month'),
+                indates[3])
+        self.assertEqual(dates.last_of_period(dt.date(2012, 3, 1),
+                'quarter'), indates[3])
+        self.assertEqual(dates.last_of_period(dt.date(2012, 12, 1), 'year'),
+                indates[5])
+        self.assertIsNone(dates.first_of_period(dt.date(2012, 3, 1), 'month'))
+        self.assertIsNone(dates.last_of_period(dt.date(2013, 3, 1), 'year'))
+        self.assertEqual(dates.period_subset(dt.date(2012, 1, 1), 'quarter'),
+                indates[1:4])
+        self.assertEqual(dates.period_subset(dt.date(2012, 3, 1), 'month'),
+                [])
+        self.assertEqual(dates.periods('month'), [(indates[0], indates[0]),
+                (indates[1], indates[2]), (indates[3], indates[3]),
+                (indates[4], indates[5])])
+        self.assertEqual(dates.periods('year'), [(indates[0], indates[0]),
+                (indates[1], indates[5])])
+        self.assertRaises(ValueError, dates.periods, 'day')
+        self.assertEqual(dates.same_date_last_year(dt.date(2013, 3, 1)),
+                indates[3])
+        self.assertEqual(dates.same_date_last_year(dt.date(2013, 1, 1)),
+                indates[0])
+
+    def test_periods_changed(self):
+        if self.datelist_class is not du.DateList:
+            self.skipTest('only a DateList can be changed')
+        dates = du.DateList([dt.date(2012, 1, 2), dt.date(2012, 3, 1)])
+        self.assertEqual(dates.periods('month'), [(dates[0], dates[0]),
+                (dates[1], dates[1])])
+        self.assertEqual(list(dates.index_many(dates)), [0, 1])
+        dates.append(dt.date(2012, 3, 5))
+        self.assertEqual(dates.last_of_period(dates[1], 'month'), dates[2])
+        self.assertEqual(list(dates.index_many(dates)), [0, 1, 2])
+        del dates[0]
+        self.assertEqual(dates.periods('year'), [(dates[0], dates[1])])
+        dates[1:] = [dt.date(2012, 4, 1)]
+        self.assertEqual(dates.periods('quarter'), [(dates[0], dates[0]),
+                (dates[1], dates[1])])
+
+
+    def test_sorted_mutations(self):
+        if self.datelist_class is not du.DateList:
+            self.skipTest('only a DateList can be changed')
+        indates = list(reversed(self.indates_gaps))
+        dates = du.DateList(indates)
+        self.assertEqual(indates, list(reversed(self.indates_gaps)))
+        dates.append(self.indates[2])
+        dates.insert(0, self.indates[30])
+        dates.extend([self.indates[7], self.indates[1], self.indates[4]])
+        dates += [self.indates[0]]
+        expected = sorted(self.indates_gaps + [self.indates[2],
+                self.indates[30], self.indates[7], self.indates[1],
+                self.indates[4], self.indates[0]])
+        self.assertEqual(dates, expected)
+        dates[0] = self.indates[29]
+        self.assertEqual(dates, sorted(expected[1:] + [self.indates[29]]))
+        self.assertRaises(TypeError, dates.reverse)
+        self.assertRaises(TypeError, dates.sort, reverse=True)
+        dates = du.DateList(indates, sort=False)
+        dates.index(indates[0])
+        dates.sort()
+        self.assertEqual(dates, self.indates_gaps)
+        self.assertEqual(dates.index(self.indates_gaps[3]), 3)
+        # unique
+        dates = du.DateList(self.indates_gaps + self.indates_gaps[:3],
+                unique=True)
+        self.assertEqual(dates, self.indates_gaps)
+        dates.append(self.indates_gaps[5])
+        dates.extend(self.indates_gaps[2:4] + [self.indates[1]])
+        dates[0] = self.indates_gaps[1]
+        self.assertEqual(dates, [self.indates[1]] + self.indates_gaps[1:])
+        dates *= 2
+        self.assertEqual(dates, [self.indates[1]] + self.indates_gaps[1:])
+        self.assertEqual(du.DateList(), [])
+
+    def test_pickle(self):
+        self.dates.index(self.indates[3])
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            dates = pickle.loads(pickle.dumps(self.dates, protocol))
+            self.assertEqual(type(dates), self.datelist_class)
+            self.assertEqual(list(dates), self.indates)
+        dates = du.DateList(self.indates[:2], unique=True)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            copy = pickle.loads(pickle.dumps(dates, protocol))
+            copy.append(self.indates[1])
+            self.assertEqual(copy, self.indates[:2])
+
+
+class CompactDateListTests(DateListTests):
+
+    datelist_class = du.CompactDateList
+
+    def test_compact(self):
+        self.assertEqual(list(self.dates), self.indates)
+        self.assertEqual(self.dates, self.indates)
+        self.assertEqual(self.dates[3:5], self.indates[3:5])
+        self.assertIsInstance(self.dates[3:5], du.CompactDateList)
+        self.assertEqual(self.dates[-1], self.indates[-1])
+        self.assertIn(self.indates[4], self.dates_gaps)
+        self.assertNotIn(self.indates[3], self.dates_gaps)
+        self.assertEqual(self.dates_gaps.to_datelist(), self.indates_gaps)
+        self.assertEqual(du.CompactDateList(reversed(self.indates)),
+                self.dates)
+        self.assertNotIn(self.indates[0], du.CompactDateList([]))
+
+
 class TestMathUtils(TestCase):
 
     def setUp(self):
@@ -275,6 +789,42 @@ class TestMathUtils(TestCase):
         self.assertEqual(mu.div(0.5,0.25), 2.)
         self.assertEqual(mu.div(0.2, 0.1), 2.)
 
+    def check_div_many(self):
+        numerators = [0, 0, 1, -1, 2, 2, 0.5, 3]
+        denominators = [0, 1, 0, 0., 1, 1.25, 0.25, -2]
+        expected = [mu.div(n, d) for n, d in zip(numerators, denominators)]
+        self.assertEqual(list(mu.div_many(numerators, denominators)), 
+                expected)
+        self.assertEqual(list(mu.div_many(numerators, denominators, 'none')),
+                [None if d == 0 and n != 0 else q for n, d, q in 
+                zip(numerators, denominators, expected)])
+        nans = mu.div_many(numerators, denominators, 'nan')
+        self.assertEqual([q != q for q in nans], 
+                [False, False, True, True, False, False, False, False])
+        self.assertEqual(list(mu.div_many([0, 1], [0, 2], 'raise')), 
+                [0., 0.5])
+        self.assertRaises(ZeroDivisionError, mu.div_many, [0, 1], [0, 0], 
+                'raise')
+        self.assertRaises(ValueError, mu.div_many, [1], [1], 'abc')
+        self.assertRaises(ValueError, mu.div_many, [1, 2, 3], [1, 2])
+        self.assertRaises(ValueError, mu.div_many, [1, 2, 3], [2])
+        self.assertEqual(len(mu.div_many([], [])), 0)
+
+    @skipIf(numpy is None, 'numpy is not installed')
+    def test_div_many_numpy(self):
+        self.check_div_many()
+        quotients = mu.div_many(numpy.array([1, 0, 3]), numpy.array([0, 0, 2]))
+        self.assertEqual(quotients.dtype, float)
+        self.assertEqual(list(quotients), [float('inf'), 0., 1.5])
+
+    def test_div_many_python(self):
+        mu_numpy = mu.numpy
+        mu.numpy = None
+        try:
+            self.check_div_many()
+        finally:
+            mu.numpy = mu_numpy
+
 
     def test_eval_conditions(self):
         self.assertTrue(mu.eval_conditions(None))
@@ -348,6 +898,261 @@ class TestMathUtils(TestCase):
                 (('x', 'abc', 1), {'abc': 'and'}),
                                  ):
             self.assertRaises(ValueError, mu.eval_conditions, conditions, data)
+        # the arguments are evaluated before the operator is checked
+        for conditions, data in (
+                ((('x', 'gt', 1), 'abc', 2), {}),
+                ((1, 'abc', ('x', 'and', True)), {'x': 1}),
+                                 ):
+            self.assertRaises(TypeError, mu.eval_conditions, conditions, data)
+            self.assertRaises(ValueError, mu.compile_conditions, conditions)
+
+    def test_eval_conditions_operators(self):
+        data = {'x': 3, 'y': 0, 's': 'abc', 'b': True}
+        for conditions, expected in (
+                (('x', 'add', 1.5), 4.5),
+                (('x', 'sub', 'x'), 0),
+                (('x', 'mul', 2), 6),
+                (('x', 'truediv', 2), 1.5),
+                (('x', 'truediv', 'y'), float('inf')),
+                (('y', 'truediv', 'y'), 0.),
+                ((('x', 'mul', 2), 'gt', 5), True),
+                (('x', 'in', (1, 2, 3)), True),
+                (('x', 'in', [1, 2]), False),
+                (('x', 'not in', set([1, 2])), True),
+                (('s', 'in', ('abc', 'def')), True),
+                (('a', 'in', 's'), True),
+                ):
+            self.assertEqual(mu.eval_conditions(conditions, data), expected,
+                    conditions)
+        for conditions in (('s', 'add', 1), ('b', 'mul', 2),
+                (1, 'truediv', 'z'), ('x', 'in', 3), ('b', 'in', 'xyz')):
+            self.assertRaises(TypeError, mu.eval_conditions, conditions, data)
+        # short circuit: the second argument is not evaluated
+        self.assertFalse(mu.eval_conditions((False, 'and', 15)))
+        self.assertTrue(mu.eval_conditions((('x', 'eq', 3), 'or',
+                ('s', 'gt', 1)), data))
+        self.assertRaises(TypeError, mu.eval_conditions, (True, 'and', 15))
+        self.assertRaises(TypeError, mu.eval_conditions, (False, 'or', 15))
+
+    def test_eval_conditions_chain(self):
+        # a long chain is flattened, so it doesn't exceed the recursion limit
+        conditions = ('x', 'gt', 0)
+        for n in range(5000):
+            conditions = (('x', 'gt', n), 'or', conditions)
+        self.assertTrue(mu.eval_conditions(conditions, {'x': 1}))
+        self.assertFalse(mu.eval_conditions(conditions, {'x': 0}))
+        # an equal copy is looked up in the cache without recursion
+        def chain(n):
+            conditions = ('x', 'gt', 0)
+            for i in range(n):
+                conditions = (('x', 'gt', i), 'or', conditions)
+            return conditions
+        self.assertTrue(mu.eval_conditions(chain(5000), {'x': 1}))
+        self.assertFalse(mu.eval_conditions(chain(5000), {'x': 0}))
+        rule_set = mu.RuleSet([('a', chain(5000)), ('b', chain(5000)),
+                ('c', (chain(5000), 'and', ('x', 'eq', 1)))])
+        self.assertEqual(rule_set.match({'x': 1}), ['a', 'b', 'c'])
+        self.assertEqual(rule_set.match({'x': 0}), [])
+        self.assertEqual(list(mu.eval_conditions_many(chain(5000), 
+                {'x': [0, 1, 2]})), [False, True, True])
+        # equal conditions with other types do not share a cache entry
+        self.assertNotEqual(mu._conditions_key((1, 'and', True)),
+                mu._conditions_key((True, 'and', True)))
+        self.assertNotEqual(mu._conditions_key(((1, 2), 'eq', 3)),
+                mu._conditions_key((1, 2, 'eq', 3)))
+        conditions = (True, 'and', (('x', 'lt', 2), 'and', (True, 'or',
+                'y')))
+        self.assertEqual(mu._flatten(conditions), [True, ('x', 'lt', 2),
+                (True, 'or', 'y')])
+        self.assertTrue(mu.eval_conditions(conditions, {'x': 1}))
+
+    def test_compile_conditions(self):
+        self.assertTrue(mu.compile_conditions(None)({'x': 1}))
+        self.assertRaises(TypeError, mu.compile_conditions, (1, 2, 3, 4))
+        self.assertRaises(ValueError, mu.compile_conditions, (1, 'abc', 2))
+        self.assertRaises(ValueError, mu.compile_conditions,
+                ((1, 'lt', 2), 'and', (1, 'abc', 2)))
+        conditions = (('x', 'lt', 1), 'or', (('y', 'eq', 'a'), 'and', 'z'))
+        evaluate = mu.compile_conditions(conditions)
+        for data in ({'x': 0, 'y': 'b', 'z': False},
+                     {'x': 2, 'y': 'a', 'z': True},
+                     {'x': 2, 'y': 'a', 'z': False},
+                     {'x': 2., 'y': 'b', 'z': True},
+                    ):
+            self.assertEqual(evaluate(data),
+                    mu.eval_conditions(conditions, data), data)
+        self.assertRaises(TypeError, evaluate, {'x': 'a', 'y': 'a', 'z': True})
+        self.assertRaises(TypeError, evaluate, {'x': 2, 'y': 'a', 'z': 1})
+        evaluate = mu.compile_conditions("('x', 'gt', 1)")
+        self.assertTrue(evaluate({'x': 2}))
+        self.assertFalse(evaluate({'x': 1}))
+
+    def test_eval_conditions_cache(self):
+        # equal, but differently typed conditions must not share a cache entry
+        self.assertTrue(mu.eval_conditions((True, 'and', True)))
+        self.assertRaises(TypeError, mu.eval_conditions, (1, 'and', True))
+        # unhashable arguments still raise a TypeError
+        self.assertRaises(TypeError, mu.eval_conditions, ([1], 'eq', [1]))
+
+    def check_eval_conditions_many(self):
+        columns = {'x': [0, 1, 2, 3], 'y': [0.5, 0.5, 2.5, 2.5], 
+                'z': ['a', 'b', 'a', 'b'], 'b': [True, False, True, False]}
+        records = [dict((k, columns[k][i]) for k in columns)
+                for i in range(4)]
+        for conditions in (None,
+                           ('x', 'gt', 1),
+                           (1, 'lt', 'y'),
+                           ('x', 'le', 'y'),
+                           ('z', 'eq', 'a'),
+                           (('x', 'ge', 1), 'and', ('z', 'ne', 'a')),
+                           (('x', 'eq', 0), 'or', 'b'),
+                           ((1, 'lt', 2), 'and', 'b'),
+                           (1, 'gt', 2),
+                           ((('x', 'mul', 'y'), 'sub', 1), 'gt', 0.5),
+                           (('x', 'truediv', ('y', 'sub', 0.5)), 'ge', 1),
+                           ('z', 'in', ('a', 'c')),
+                           ('x', 'not in', [1, 2]),
+                           ((('x', 'gt', 0), 'and', ('x', 'lt', 3)), 'and',
+                                'b'),
+                          ):
+            expected = [mu.eval_conditions(conditions, r) for r in records]
+            self.assertEqual(list(mu.eval_conditions_many(conditions,
+                    columns)), expected, conditions)
+            self.assertEqual(list(mu.eval_conditions_many(conditions,
+                    records)), expected, conditions)
+        for conditions in (('x', 'eq', 'z'), ('x', 'and', 'b'),
+                ('b', 'eq', 1)):
+            self.assertRaises(TypeError, mu.eval_conditions_many, conditions,
+                    columns)
+        self.assertRaises(ValueError, mu.eval_conditions_many, 
+                ('x', 'abc', 1), columns)
+        self.assertRaises(TypeError, mu.eval_conditions_many,
+                (('x', 'gt', 's'), 'abc', 1), columns)
+        for invalid in ('garbage', "('x', 'gt', 1"):
+            self.assertRaises(TypeError, mu.eval_conditions_many, invalid,
+                    columns)
+        self.assertEqual(list(mu.eval_conditions_many("('x', 'gt', 1)",
+                columns)), [False, False, True, True])
+        # mixed types can not be vectorized, but give the same result
+        mixed = {'x': [1, 'a', 2.5]}
+        self.assertEqual(list(mu.eval_conditions_many(('x', 'eq', 'x'),
+                mixed)), [True] * 3)
+        self.assertRaises(TypeError, mu.eval_conditions_many, ('x', 'gt', 1),
+                mixed)
+        self.assertEqual(len(mu.eval_conditions_many(('x', 'gt', 1), {})), 0)
+        # 'and' and 'or' do not need the argument that raises a TypeError
+        for conditions, expected in (
+                ((('x', 'gt', 5), 'and', ('z', 'eq', 1)), [False] * 4),
+                ((('x', 'ge', 0), 'or', ('z', 'gt', 1)), [True] * 4),
+                (((('x', 'gt', 5), 'and', ('z', 'eq', 1)), 'or', 'b'),
+                    [True, False, True, False])):
+            self.assertEqual(list(mu.eval_conditions_many(conditions,
+                    columns)), expected, conditions)
+            self.assertEqual(list(mu.eval_conditions_many(conditions,
+                    records)), expected, conditions)
+        self.assertRaises(TypeError, mu.eval_conditions_many, 
+                (('x', 'gt', 1), 'and', ('z', 'eq', 1)), columns)
+
+    @skipIf(numpy is None, 'numpy is not installed')
+    def test_eval_conditions_many_numpy(self):
+        self.check_eval_conditions_many()
+        # a numpy array and a column that can not be vectorized
+        for conditions, expected in (
+                ((('x', 'gt', 1), 'and', ('y', 'eq', 'y')), [False, True]),
+                (('x', 'in', (2, 3)), [False, True]),
+                ((('y', 'eq', 'y'), 'or', 'b'), [True, True])):
+            mixed = {'x': numpy.array([1, 2]), 'y': [1, None],
+                    'b': numpy.array([True, False])}
+            self.assertEqual(list(mu.eval_conditions_many(conditions, 
+                    mixed)), expected, conditions)
+        mask = mu.eval_conditions_many(('x', 'gt', 1), 
+                {'x': numpy.arange(5)})
+        self.assertEqual(mask.dtype, bool)
+        self.assertEqual(list(mask), [False, False, True, True, True])
+
+    def test_eval_conditions_many_python(self):
+        mu_numpy = mu.numpy
+        mu.numpy = None
+        try:
+            self.check_eval_conditions_many()
+        finally:
+            mu.numpy = mu_numpy
+
+    def test_rule_set(self):
+        rules = [('nl', ('country', 'eq', 'NL')),
+                 ('nl_big', (('country', 'eq', 'NL'), 'and', 
+                        ('amount', 'ge', 1000))),
+                 ('small', ('amount', 'lt', 10)),
+                 ('medium', ((10, 'le', 'amount'), 'and', 
+                        ('amount', 'le', 100))),
+                 ('huge', (1e6, 'lt', 'amount')),
+                 ('be_or_de', (('country', 'eq', 'BE'), 'or', 
+                        ('country', 'eq', 'DE'))),
+                 ('in_eu', ('country', 'in', ('NL', 'BE', 'DE'))),
+                 ('ratio', (('amount', 'truediv', 'count'), 'gt', 100)),
+                 ('flag', ('flag', 'eq', True)),
+                 ('always', None),
+                 ('string', "('country', 'ne', 'NL')"),
+                 ('variables', ('country', 'eq', 'home')),
+                ]
+        rule_set = mu.RuleSet(rules)
+        self.assertEqual(len(rule_set), len(rules))
+        self.assertTrue('nl' in rule_set)
+        records = [{'country': 'NL', 'amount': 5, 'count': 0, 'flag': True},
+                   {'country': 'NL', 'amount': 1000., 'count': 1,
+                        'flag': False},
+                   {'country': 'BE', 'amount': 10, 'count': 1, 'flag': True},
+                   {'country': 'DE', 'amount': 100, 'count': 2,
+                        'flag': False},
+                   {'country': 'US', 'amount': 2e6, 'count': 0, 
+                        'flag': False},
+                   {'country': 'NL', 'amount': 50, 'count': 0, 'flag': True,
+                        'home': 'NL'},
+                  ]
+        for data in records:
+            expected = [rule_id for rule_id, conditions in rules
+                    if mu.eval_conditions(conditions, data) is True]
+            self.assertEqual(rule_set.match(data), expected, data)
+        self.assertEqual(rule_set.match_many(records[:2]), 
+                [rule_set.match(records[0]), rule_set.match(records[1])])
+        # rules that are excluded by the index are not evaluated, the ratio
+        # rule is not indexed
+        rule_set.remove('ratio')
+        self.assertEqual(rule_set.match({'country': 'XX', 'amount': 'a',
+                'count': 1, 'flag': 'no'}), ['always', 'string'])
+        self.assertRaises(TypeError, rule_set.match, {'country': 'NL', 
+                'amount': 'a', 'count': 1, 'flag': False})
+        rule_set.remove('always')
+        self.assertFalse('always' in rule_set)
+        self.assertEqual(rule_set.match({'country': 'XX', 'amount': 'a',
+                'count': 1, 'flag': 'no'}), ['string'])
+        self.assertRaises(KeyError, rule_set.remove, 'always')
+        self.assertRaises(ValueError, rule_set.add, 'nl', ('x', 'eq', 1))
+        self.assertRaises(ValueError, rule_set.add, 'new', ('x', 'abc', 1))
+        self.assertRaises(TypeError, rule_set.add, 'new', (1, 2))
+        for invalid in ('garbage', "('x', 'eq', 1"):
+            self.assertRaises(TypeError, rule_set.add, 'new', invalid)
+        self.assertRaises(TypeError, mu.RuleSet, [('r', 'garbage')])
+        self.assertFalse('new' in rule_set)
+        self.assertEqual(mu.RuleSet().match({'x': 1}), [])
+
+    def test_rule_set_shared_conditions(self):
+        calls = []
+        class Counted(object):
+            # a data value that counts how often it is compared
+            def __eq__(self, other):
+                calls.append(other)
+                return False
+            __hash__ = object.__hash__
+        shared = ('x', 'eq', 'y')
+        rule_set = mu.RuleSet([('a', (shared, 'or', True)),
+                ('b', (True, 'and', shared)), ('c', (shared, 'or', False))])
+        counted = Counted()
+        for _ in range(2):
+            del calls[:]
+            self.assertEqual(rule_set.match({'x': counted, 'y': counted}),
+                    ['a'])
+            self.assertEqual(len(calls), 1)
 
 
 class TestStringUtils(TestCase):
@@ -377,6 +1182,28 @@ class TestStringUtils(TestCase):
         self.assertEqual(set(abc), {'A', 'B', 'C'})
 
 
+    def test_random_strings(self):
+        self.assertEqual(su.random_strings(0), [])
+        for secure in (False, True):
+            strings = su.random_strings(1000, secure=secure)
+            self.assertEqual(len(strings), 1000)
+            self.assertEqual(set(len(s) for s in strings), {8})
+            # could theoretically fail, but very unlikely
+            self.assertEqual(len(set(strings)), 1000)
+            self.assertEqual(set(''.join(strings)), 
+                    set(string.ascii_letters + string.digits))
+            strings = su.random_strings(100, 3, 'ABC+-', secure)
+            self.assertEqual(set(len(s) for s in strings), {3})
+            self.assertEqual(set(''.join(strings)), set('ABC+-'))
+        self.assertRaises(ValueError, su.random_strings, 5, 0)
+        self.assertRaises(ValueError, su.random_strings, 5, 5, 'x' * 257)
+        self.assertRaises(ValueError, su.random_strings, 5, 5, u'\u20ac')
+        random.seed(1)
+        strings = su.random_strings(10)
+        random.seed(1)
+        self.assertEqual(su.random_strings(10), strings)
+
+
     def test_safe_eval(self):
         self.assertEqual(su.safe_eval('15'), 15)
         self.assertEqual(su.safe_eval('8.45'), 8.45)
@@ -387,6 +1214,86 @@ class TestStringUtils(TestCase):
             self.assertIsNone(su.safe_eval(s))
 
 
+    def test_safe_eval_cache(self):
+        su.literal_cache.clear()
+        self.assertEqual(su.safe_eval('(1, 2)'), (1, 2))
+        self.assertIs(su.safe_eval('(1, 2)'), su.safe_eval('(1, 2)'))
+        self.assertIsNone(su.safe_eval('[3,1'))
+        self.assertIsNone(su.safe_eval('[3,1'))
+        self.assertEqual(su.literal_cache.info(), {'hits': 3, 'misses': 2,
+                'maxsize': 1024, 'size': 2})
+        # mutable results are copies
+        for str_in in ("{'a': [1, {2: 3}]}", '([1], 2)', "[{'a': 1}]"):
+            obj = su.safe_eval(str_in)
+            self.assertEqual(su.safe_eval(str_in), obj)
+            self.assertIsNot(su.safe_eval(str_in), obj)
+        obj = su.safe_eval("{'a': [1, {2: 3}]}")
+        obj['a'][1][2] = 4
+        self.assertEqual(su.safe_eval("{'a': [1, {2: 3}]}"), 
+                {'a': [1, {2: 3}]})
+        # the oldest items are discarded
+        cache = su.LRUCache(4)
+        for key in range(4):
+            cache[key] = key
+        cache.get(0)
+        cache[4] = 4
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get(0), 0)
+        self.assertEqual(cache.get(4), 4)
+        self.assertIsNone(cache.get(1))
+        # caching can be disabled
+        su.literal_cache.maxsize = 0
+        try:
+            su.literal_cache.clear()
+            self.assertEqual(su.safe_eval('(1, 2)'), (1, 2))
+            self.assertEqual(len(su.literal_cache), 0)
+        finally:
+            su.literal_cache.maxsize = 1024
+
+    def test_lru_cache_threads(self):
+        cache = su.LRUCache(8)
+        errors = []
+        def fill(offset):
+            try:
+                for key in range(offset, offset + 20000):
+                    cache[key % 100] = key
+                    cache.get((key + 50) % 100)
+            except Exception as error:
+                errors.append(error)
+        threads = [threading.Thread(target=fill, args=(i * 7,)) 
+                for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertTrue(len(cache) <= 8)
+
+
+    def test_safe_eval_fast(self):
+        maxsize = su.literal_cache.maxsize
+        su.literal_cache.maxsize = 0
+        try:
+            for str_in in ('15', '-8.45', '.5e2', '1.', '(1,2)', '(1)', '()',
+                    '(1,)', '[1,2,3,]', '[]', "{'a':1, 4:'asdf',}", '{}', 
+                    '(True, None, False)', '{"k": (1, "v", [2.5, -3])}',
+                    "(('a', 'lt', 1), 'and', ('b', 'eq', 'x y'))", '1 ',
+                    # handled by ast.literal_eval
+                    ' 1', '010', '- 1', '1-2', "'a' 'b'", "u'a'", "'a\\nb'",
+                    '99999999999999999999', '1j', '{1:2 3:4}', '[1 2]', 
+                    '{[1]: 2}', '(1,,)', '[3,1', 'raise SystemExit', ''):
+                expected = su.safe_eval(str_in, 'ast')
+                result = su.safe_eval(str_in, 'fast')
+                self.assertEqual(result, expected, str_in)
+                self.assertEqual(type(result), type(expected), str_in)
+            self.assertRaises(ValueError, su.safe_eval, '1', 'abc')
+            su.safe_eval_engine = 'fast'
+            self.assertEqual(su.str2tuple('(1, 2)'), (1, 2))
+        finally:
+            su.safe_eval_engine = 'ast'
+            su.literal_cache.maxsize = maxsize
+
+
     def test_str2dict(self):
         self.assertEqual(su.str2dict("{'a':1, 4:'asdf'}"), {'a':1, 4:'asdf'})
         self.assertIsNone(su.str2dict("{'a':1 4:'asdf'}"))
@@ -409,6 +1316,27 @@ class TestStringUtils(TestCase):
         self.assertIsNone(su.str2dict_keys('asdf'))
 
 
+    def test_str2dict_items(self):
+        dict_string = "{'b': [1, 2], 'a': 1.5, 'c': ('x', None)}"
+        items = [('a', 1.5), ('b', [1, 2]), ('c', ('x', None))]
+        self.assertEqual(su.str2dict_items(dict_string), items)
+        self.assertIsNone(su.str2dict_items('(1, 2)'))
+        self.assertIsNone(su.str2dict_items('asdf'))
+        # the cached dict must not be changed through the results
+        su.str2dict_items(dict_string)[1][1].append(3)
+        su.str2dict_values(dict_string)[1].append(3)
+        self.assertEqual(su.str2dict_items(dict_string), items)
+        self.assertEqual(su.str2dict_values(dict_string),
+                [1.5, [1, 2], ('x', None)])
+        self.assertEqual(su.str2dict_keys(dict_string), ['a', 'b', 'c'])
+        maxsize = su.literal_cache.maxsize
+        su.literal_cache.maxsize = 0
+        try:
+            self.assertEqual(su.str2dict_items(dict_string), items)
+        finally:
+            su.literal_cache.maxsize = maxsize
+
+
     def test_decstr2int(self):
         self.assertEqual(su.decstr2int('123.456', -4), 0)
         self.assertEqual(su.decstr2int('123.456', -3), 0)
@@ -430,5 +1358,89 @@ class TestStringUtils(TestCase):
         self.assertRaises(ValueError, su.decstr2int, '', 1)
 
 
+    def test_decstr2int_many(self):
+        dec_strs = ['123.456', '123', '0.5', '12.', '.5', '-1.25', '1e2', 
+                '1.2.3', '', '007.010', '12345678901234567890.5', u'1\xb2',
+                u'5.\xb2', u'12.5']
+        for decimals in range(-4, 6):
+            expected = []
+            expected_invalid = []
+            for i, dec_str in enumerate(dec_strs):
+                try:
+                    expected.append(su.decstr2int(dec_str, decimals))
+                except ValueError:
+                    expected.append(-1)
+                    expected_invalid.append(i)
+            invalid = []
+            self.assertEqual(list(su.decstr2int_many(iter(dec_strs), 
+                    decimals, invalid, -1)), expected)
+            self.assertEqual(invalid, expected_invalid)
+        self.assertEqual(list(su.decstr2int_many(['1.5', 'x'], 2)), 
+                [150, None])
+        # values that are not strings are invalid as well
+        invalid = []
+        self.assertEqual(list(su.decstr2int_many(['1.5', None, 3, '2'], 2,
+                invalid, -1)), [150, -1, -1, 200])
+        self.assertEqual(invalid, [1, 2])
+        self.assertRaises(TypeError, su.decstr2int_many, ['1.2'], 0.5)
+
+
+class TestParallelUtils(TestCase):
+
+    def check_convert_many(self, **options):
+        date_strs = ['2012{:02}{:02}'.format(m, d) for m in range(1, 13)
+                for d in range(1, 29)]
+        self.assertEqual(list(pu.convert_many(iter(date_strs), 'datestr2date',
+                **options)), [du.datestr2date(s) for s in date_strs])
+        time_strs = ['{:02}:{:02}'.format(h, m) for h in range(24)
+                for m in range(0, 60, 7)]
+        self.assertEqual(list(pu.convert_many(time_strs, 'timestr2time',
+                **options)), [du.timestr2time(s) for s in time_strs])
+        # other formats than the first string are parsed by timestr2time
+        time_strs = ['120000', '1:02', '23:59:59', '000000'] * 30
+        self.assertEqual(list(pu.convert_many(time_strs, 'timestr2time',
+                **options)), [du.timestr2time(s) for s in time_strs])
+        self.assertRaises(ValueError, list, pu.convert_many(
+                time_strs + ['24:00'], 'timestr2time', **options))
+        dec_strs = ['{}.{}'.format(n, n % 7) for n in range(-100, 200)]
+        self.assertEqual(list(pu.convert_many(dec_strs, 'decstr2int', (2,),
+                **options)), [su.decstr2int(s, 2) for s in dec_strs])
+        self.assertRaises(ValueError, list, pu.convert_many(
+                date_strs + ['2012-13-01'], 'datestr2date', **options))
+        self.assertRaises(ValueError, list, pu.convert_many(
+                dec_strs + ['1.2.3'], 'decstr2int', (2,), **options))
+        self.assertEqual(list(pu.convert_many([], 'decstr2int', (2,),
+                **options)), [])
+
+    def test_convert_many_serial(self):
+        self.check_convert_many(chunksize=50)
+        self.check_convert_many(workers=1, serial_threshold=10)
+
+    def test_convert_many_parallel(self):
+        self.check_convert_many(workers=2, chunksize=50, serial_threshold=10)
+
+    def test_convert_many_streams(self):
+        read = []
+        def date_strs():
+            for i in range(10000):
+                read.append(i)
+                yield '2012{:02}{:02}'.format(i % 12 + 1, i % 28 + 1)
+        dates = pu.convert_many(date_strs(), 'datestr2date', workers=2,
+                chunksize=100, serial_threshold=100)
+        self.assertEqual(next(dates), dt.date(2012, 1, 1))
+        # the strings of the chunks in flight and the next chunk
+        self.assertTrue(len(read) <= 100 * (pu.CHUNKS_IN_FLIGHT * 2 + 1) + 1,
+                len(read))
+        self.assertEqual(len(list(dates)), 9999)
+        self.assertEqual(len(read), 10000)
+
+    def test_convert_many_arguments(self):
+        self.assertRaises(ValueError, pu.convert_many, [], 'str2tuple')
+        self.assertRaises(ValueError, pu.convert_many, [], 'datestr2date',
+                workers=0)
+        self.assertRaises(ValueError, pu.convert_many, [], 'datestr2date',
+                chunksize=0)
+
+
 if __name__ == '__main__':
     main()